@@ -0,0 +1,96 @@
+"""
+Synthetic, deterministic fixtures for the render benchmarks.
+"""
+
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+# Output size, a typical phone photo and an oversized camera export
+RESOLUTIONS = {
+    "1080x1350": (1080, 1350),
+    "3024x4032": (3024, 4032),
+    "6000x4000": (6000, 4000),
+}
+
+# Default --sizes; pass --sizes 10,100,1000 for a longer run
+QUOTE_SET_SIZES = (10, 100)
+
+# Checked in order when --bold-font / --light-font are not given
+FONT_CANDIDATES = {
+    "bold": [
+        "/usr/share/fonts/truetype/dejavu/DejaVuSerif-Bold.ttf",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+        "/Library/Fonts/Georgia Bold.ttf",
+        "C:/Windows/Fonts/georgiab.ttf",
+    ],
+    "light": [
+        "/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/Library/Fonts/Georgia.ttf",
+        "C:/Windows/Fonts/georgia.ttf",
+    ],
+}
+
+_WORDS = (
+    "the love of God is patient and kind it does not envy it does not boast "
+    "pray hope and do not worry be who you were meant to be and you will set "
+    "the world on fire grace humility joy peace faith soul heart silence light "
+    "Lord mercy charity will prayer suffering cross heaven truth"
+).split()
+
+_SAINTS = [
+    "St. Augustine of Hippo",
+    "St. Catherine of Siena",
+    "St. Francis de Sales",
+    "St. Padre Pio",
+    "St. Teresa of Avila",
+    "St. Thérèse of Lisieux",
+    "St. John of the Cross",
+]
+
+
+def make_background(size, seed=0, fmt='JPEG'):
+    """Encoded photo-like background: smooth gradients plus sensor noise."""
+    rng = np.random.default_rng(seed)
+    low = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    img = Image.fromarray(low).resize(size, Image.Resampling.BICUBIC)
+
+    noise = rng.normal(0, 12, (size[1], size[0], 1)).astype(np.int16)
+    arr = np.clip(np.asarray(img, dtype=np.int16) + noise, 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(arr).save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+def make_grain(size=(1080, 1350), seed=0):
+    """Gaussian film grain texture."""
+    rng = np.random.default_rng(seed)
+    arr = np.clip(rng.normal(128, 40, (size[1], size[0])), 0, 255).astype(np.uint8)
+    return Image.fromarray(arr)
+
+
+def make_quotes(count, seed=0):
+    """Quote records of 5 to 60 words in the app's JSON shape."""
+    rng = np.random.default_rng(seed)
+    quotes = []
+    for _ in range(count):
+        words = rng.choice(_WORDS, size=int(rng.integers(5, 61)))
+        text = ' '.join(words).capitalize() + '.'
+        quotes.append({"text": text, "saint": _SAINTS[int(rng.integers(len(_SAINTS)))]})
+    return quotes
+
+
+def find_font(weight, path=None):
+    """Read a font given explicitly or found on the system."""
+    candidates = [path] if path else FONT_CANDIDATES[weight]
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            with open(candidate, 'rb') as f:
+                return f.read()
+    raise SystemExit(
+        f"No {weight} font found; pass --{weight}-font with a TTF/OTF file"
+    )
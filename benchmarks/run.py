@@ -0,0 +1,407 @@
+"""
+Render pipeline benchmarks.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 10,100,1000 --workers 4 --json bench.json
+
+Stage timings cover background preparation at several source resolutions,
+grain blending, text wrapping, JPEG encoding, a warm live preview and
+archive writes. Batch runs report images/sec and peak memory for each
+render mode, and the codec table compares encode time and file size of
+every encoder against Instagram's upload limits.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw
+
+from daily_saint import (
+    CONFIG,
+    BatchRenderer,
+    GrainField,
+    add_image_to_zip,
+    background_cache,
+    build_jobs,
+    compare_encoders,
+    content_hash,
+    current_rss,
+    encode_jpeg,
+    font_registry,
+    generate_image,
+    group_by_background,
+    live_preview,
+    load_font,
+    make_encoder,
+    open_sink,
+    prepare_background,
+    remove_archive,
+    render_batch,
+    soft_light_blend,
+    wrap_text,
+)
+
+from .fixtures import QUOTE_SET_SIZES, RESOLUTIONS, find_font, make_background, make_grain, make_quotes
+
+MODES = {
+    "color": {"grayscale": False},
+    "grayscale": {"grayscale": True},
+    "solid-color": {"solid_color": "#1a1a1a"},
+    "grain": {"grayscale": True, "grain": True},
+}
+
+OUTPUT_SIZE = (CONFIG['output_width'], CONFIG['output_height'])
+
+
+def child_pids(pid):
+    """Pids of ``pid``'s direct children (render pool workers)."""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except (OSError, ValueError):
+        pass
+    # Kernels without CONFIG_PROC_CHILDREN: match parent pids instead
+    children = []
+    for name in os.listdir('/proc') if os.path.isdir('/proc') else ():
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                # The command name may contain spaces; fields resume after ')'
+                ppid = int(f.read().rpartition(')')[2].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(name))
+    return children
+
+
+class RssSampler:
+    """Peak RSS of this process plus its children while a batch runs.
+
+    ru_maxrss is a lifetime high-water mark, so every batch after the
+    largest one would report the same number. This polls /proc instead and
+    reports the peak above the RSS on entry; ``peak_mb`` is None where
+    /proc is unavailable.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start_rss = None
+        self.peak_rss = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _total(self):
+        pid = os.getpid()
+        total = current_rss()
+        if total is None:
+            return None
+        for child in child_pids(pid):
+            # Workers may exit between listing and reading
+            total += current_rss(child) or 0
+        return total
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self._total() or 0)
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = self._total()
+        if self.start_rss is not None:
+            self._thread = threading.Thread(target=self._poll, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak_rss = max(self.peak_rss, self._total() or 0)
+        return False
+
+    @property
+    def peak_mb(self):
+        if self.start_rss is None:
+            return None
+        return round((self.peak_rss - self.start_rss) / (1024 * 1024), 1)
+
+
+def time_call(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def stage_row(name, times, per=1):
+    ms = [t * 1000 / per for t in times]
+    return {
+        "stage": name,
+        "runs": len(times) * per,
+        "mean_ms": round(statistics.mean(ms), 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "min_ms": round(min(ms), 3),
+    }
+
+
+# =============================================================================
+# STAGES
+# =============================================================================
+
+def bench_stages(bold_font, light_font, repeat, seed):
+    rows = []
+
+    for label, size in RESOLUTIONS.items():
+        data = make_background(size, seed=seed)
+        for grayscale in (False, True):
+            name = f"prepare background {label} {'gray' if grayscale else 'color'}"
+            times = time_call(lambda: prepare_background(data, OUTPUT_SIZE, grayscale=grayscale), repeat)
+            rows.append(stage_row(name, times))
+
+    base = prepare_background(make_background(OUTPUT_SIZE, seed=seed), OUTPUT_SIZE)
+    grain = make_grain(OUTPUT_SIZE, seed=seed)
+
+    rows.append(stage_row(
+        "soft_light_blend (builds table)",
+        time_call(lambda: soft_light_blend(base, grain, 0.5), repeat)
+    ))
+    field = GrainField(grain, 0.5)
+    rows.append(stage_row("grain apply (cached table)", time_call(lambda: field.apply(base), repeat)))
+
+    quotes = make_quotes(100, seed=seed)
+    font = load_font(bold_font, int(OUTPUT_SIZE[0] * CONFIG['quote_font_percent']))
+    draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+    max_width = OUTPUT_SIZE[0] - 2 * int(OUTPUT_SIZE[0] * CONFIG['margin_lr_percent'])
+
+    def wrap_all():
+        for quote in quotes:
+            wrap_text(quote['text'], font, max_width, draw)
+
+    rows.append(stage_row("wrap_text (per quote)", time_call(wrap_all, repeat), per=len(quotes)))
+
+    img = generate_image(
+        quotes[0]['text'], quotes[0]['saint'],
+        solid_color="#1a1a1a",
+        bold_font_bytes=bold_font,
+        light_font_bytes=light_font
+    )
+    rows.append(stage_row("encode_jpeg q92", time_call(lambda: encode_jpeg(img), repeat)))
+
+    # Warm caches, as after the first update in the app
+    data = make_background(RESOLUTIONS['3024x4032'], seed=seed)
+    renderer = BatchRenderer(bold_font, light_font, backgrounds={content_hash(data): data}, grain_image=grain)
+    key = next(iter(renderer.backgrounds))
+    live_preview(renderer, quotes[0]['text'], quotes[0]['saint'], key)
+    rows.append(stage_row(
+        "live preview (warm, grain)",
+        time_call(lambda: live_preview(renderer, quotes[0]['text'], quotes[0]['saint'], key), repeat)
+    ))
+
+    for label, compression in (("stored", zipfile.ZIP_STORED), ("deflate", zipfile.ZIP_DEFLATED)):
+        def add_to_zip():
+            with zipfile.ZipFile(io.BytesIO(), 'w', compression) as zf:
+                add_image_to_zip(zf, 'bench.jpg', img)
+        rows.append(stage_row(f"add_image_to_zip {label}", time_call(add_to_zip, repeat)))
+
+    return rows
+
+
+# =============================================================================
+# BATCHES
+# =============================================================================
+
+def bench_batch(mode, count, bold_font, light_font, backgrounds, grain, workers, seed, trace_memory, grouped=True):
+    options = MODES[mode]
+    background_cache.clear()
+    font_registry.clear()
+
+    solid_color = options.get("solid_color")
+    jobs = build_jobs(
+        make_quotes(count, seed=seed),
+        None if solid_color else list(backgrounds),
+        seed=seed
+    )
+    if grouped:
+        jobs = group_by_background(jobs)
+    renderer = BatchRenderer(
+        bold_font_bytes=bold_font,
+        light_font_bytes=light_font,
+        backgrounds={} if solid_color else backgrounds,
+        solid_color=solid_color,
+        grayscale=options.get("grayscale", True),
+        grain_image=grain if options.get("grain") else None
+    )
+
+    if trace_memory:
+        tracemalloc.start()
+    errors = 0
+    start = time.perf_counter()
+    with RssSampler() as rss, open_sink('zip-store') as sink:
+        for result in render_batch(renderer, jobs, workers=workers):
+            if result.error:
+                errors += 1
+            else:
+                sink.add(result.filename, result.data)
+    elapsed = time.perf_counter() - start
+    traced_peak = None
+    if trace_memory:
+        traced_peak = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+    remove_archive(sink.path)
+
+    return {
+        "mode": mode,
+        "quotes": count,
+        "workers": workers,
+        "grouped": grouped,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "images_per_sec": round(count / elapsed, 2) if elapsed else None,
+        "ms_per_image": round(elapsed * 1000 / count, 2),
+        "traced_peak_mb": traced_peak,
+        # Growth over the RSS at batch start, workers included
+        "rss_peak_mb": rss.peak_mb,
+        "archive_mb": round(sink.bytes_out / (1024 * 1024), 2),
+        # Workers keep their own caches, so only sequential runs are counted here
+        "base_builds": background_cache.misses if workers <= 1 else None,
+    }
+
+
+# =============================================================================
+# CODECS
+# =============================================================================
+
+CODECS = (
+    ("jpeg", 92, None),
+    ("jpeg-progressive", 92, None),
+    ("webp", 90, None),
+    ("png", None, None),
+    ("jpeg", 92, 500),
+    ("webp", 90, 500),
+)
+
+
+def bench_codecs(bold_font, light_font, backgrounds, count, seed):
+    """Encode the same rendered images with each codec; max KB targets included."""
+    quotes = make_quotes(count, seed=seed)
+    images = [
+        generate_image(
+            quote['text'], quote['saint'],
+            background_bytes=data,
+            bold_font_bytes=bold_font,
+            light_font_bytes=light_font,
+            background_key=key
+        )
+        for quote, (key, data) in zip(quotes, backgrounds.items())
+    ]
+    encoders = [
+        make_encoder(name, quality=quality or 92, max_bytes=max_kb * 1024 if max_kb else None)
+        for name, quality, max_kb in CODECS
+    ]
+    return compare_encoders(images, encoders)
+
+
+# =============================================================================
+# REPORTING
+# =============================================================================
+
+def print_table(rows, columns):
+    widths = [max(len(c), *(len(str(r.get(c))) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(row.get(c)).ljust(w) for c, w in zip(columns, widths)))
+    print()
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks.run', description="Benchmark the render pipeline.")
+    parser.add_argument('--sizes', default=','.join(map(str, QUOTE_SET_SIZES)), help="Quote set sizes (default: %(default)s)")
+    parser.add_argument('--modes', default=','.join(MODES), help="Render modes (default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per stage timing")
+    parser.add_argument('--backgrounds', type=int, default=12, help="Distinct backgrounds per batch")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bold-font')
+    parser.add_argument('--light-font')
+    parser.add_argument('--ungrouped', action='store_true', help="Render in pairing order instead of grouped by background")
+    parser.add_argument('--skip-stages', action='store_true')
+    parser.add_argument('--skip-codecs', action='store_true')
+    parser.add_argument('--codec-images', type=int, default=4, help="Rendered images per codec (default: %(default)s)")
+    parser.add_argument('--no-trace-memory', action='store_true', help="Skip tracemalloc (less overhead)")
+    parser.add_argument('--json', help="Also write results to this file")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    modes = [m for m in args.modes.split(',') if m]
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode!r}; choose from {', '.join(MODES)}")
+
+    bold_font = find_font('bold', args.bold_font)
+    light_font = find_font('light', args.light_font)
+
+    results = {"environment": environment(), "stages": [], "codecs": [], "batches": []}
+
+    if not args.skip_stages:
+        results["stages"] = bench_stages(bold_font, light_font, args.repeat, args.seed)
+        print_table(results["stages"], ["stage", "runs", "mean_ms", "median_ms", "min_ms"])
+
+    # Mixed source resolutions, as uploads usually are
+    resolutions = list(RESOLUTIONS.values())
+    backgrounds = {}
+    for i in range(args.backgrounds):
+        data = make_background(resolutions[i % len(resolutions)], seed=args.seed + i)
+        backgrounds[content_hash(data)] = data
+    grain = make_grain(OUTPUT_SIZE, seed=args.seed)
+
+    if not args.skip_codecs:
+        results["codecs"] = bench_codecs(bold_font, light_font, backgrounds, args.codec_images, args.seed)
+        print_table(results["codecs"], [
+            "encoder", "target_kb", "images", "mean_ms", "mean_kb", "max_kb", "over_target", "instagram_ok",
+        ])
+
+    for count in sizes:
+        for mode in modes:
+            results["batches"].append(bench_batch(
+                mode, count, bold_font, light_font, backgrounds, grain,
+                args.workers, args.seed, not args.no_trace_memory,
+                grouped=not args.ungrouped
+            ))
+    print_table(results["batches"], [
+        "mode", "quotes", "workers", "grouped", "errors", "seconds", "images_per_sec",
+        "ms_per_image", "base_builds", "traced_peak_mb", "rss_peak_mb", "archive_mb",
+    ])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
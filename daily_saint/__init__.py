@@ -0,0 +1,106 @@
+"""
+The Daily Saint rendering core.
+"""
+
+from .backgrounds import (
+    BackgroundCache,
+    apply_overlay,
+    apply_overlays,
+    background_cache,
+    content_hash,
+    decode_background,
+    fit_background,
+    open_background,
+    prepare_background,
+    prepare_backgrounds,
+)
+from .batch import (
+    BatchRenderer,
+    RenderJob,
+    RenderResult,
+    build_jobs,
+    default_workers,
+    group_by_background,
+    iter_grouped,
+    iter_jobs,
+    render_batch,
+)
+from .checkpoint import (
+    CHECKPOINT_DIR,
+    BatchCheckpoint,
+    cleanup_checkpoints,
+    list_checkpoints,
+)
+from .config import CONFIG, DEFAULT_PROFILE, ICON_SVG, OUTPUT_PROFILES, profile_config
+from .encoders import (
+    DEFAULT_ENCODER,
+    ENCODERS,
+    INSTAGRAM_MAX_BYTES,
+    Encoder,
+    SizeTargetEncoder,
+    compare_encoders,
+    make_encoder,
+)
+from .fonts import FontRegistry, font_registry, load_font
+from .grain import GrainField, cached_grain_image, fit_grain, get_grain_field, load_grain_image
+from .icons import get_icon, install_icon, load_svg_as_image
+from .layout import Fit, FontMetrics, Layout, fit_text, font_metrics, layout_text
+from .memory import (
+    MemoryBudget,
+    cache_floor,
+    default_budget,
+    memory_limit,
+    trim_caches,
+)
+from .output import (
+    ARCHIVE_MODES,
+    DEFAULT_ARCHIVE_MODE,
+    OUTPUT_DIR,
+    DirectorySink,
+    OutputSink,
+    TarSink,
+    ZipSink,
+    cleanup_archives,
+    format_report,
+    new_archive_path,
+    open_sink,
+    remove_archive,
+)
+from .pairing import (
+    DEFAULT_PAIRING_MODE,
+    PAIRING_MODES,
+    BalancedDeck,
+    iter_pairing,
+    new_seed,
+    pair_backgrounds,
+    pairing_manifest,
+)
+from .previews import (
+    PREVIEW_DIR,
+    PreviewStore,
+    cleanup_previews,
+    live_preview,
+    make_thumbnail,
+    thumbnail_from_bytes,
+)
+from .profiling import BatchProfile, StageProfiler, current_rss, stage
+from .quotes import (
+    QUOTE_FORMATS,
+    QuoteReport,
+    iter_quotes,
+    quote_extensions,
+    quote_format,
+    stream_quotes,
+    validate_quote,
+)
+from .render import (
+    add_image_to_zip,
+    encode_jpeg,
+    generate_image,
+    hex_to_rgb,
+    sanitize_filename,
+    soft_light_blend,
+    wrap_text,
+)
+from .render_cache import RENDER_CACHE_DIR, RenderCache, render_fingerprint, render_key
+from .tasks import BatchTask, TaskRegistry, task_registry
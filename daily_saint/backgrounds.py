@@ -0,0 +1,305 @@
+"""
+Background preparation cache.
+Each distinct background is decoded, cropped, resized, grayscaled and
+overlaid once per option set; every quote after that reuses the base.
+"""
+
+import hashlib
+import io
+import math
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+from .config import CONFIG
+from .profiling import stage
+
+# Roughly 48 prepared 1080x1350 RGB bases
+DEFAULT_CACHE_BYTES = 192 * 1024 * 1024
+
+_overlay_luts = {}
+
+
+# =============================================================================
+# PREPARATION
+# =============================================================================
+
+def content_hash(data):
+    """Stable digest of uploaded file bytes, used as a cache key."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def apply_overlay(image, color, opacity):
+    overlay = Image.new('RGBA', image.size, (*color, int(255 * opacity)))
+    return Image.alpha_composite(image.convert('RGBA'), overlay)
+
+
+def overlay_lut():
+    """Per-channel 256-entry tables for both overlays over an opaque pixel.
+
+    Built by compositing the two overlays onto a 0-255 ramp, so a single
+    Image.point pass reproduces the alpha_composite results exactly.
+    """
+    key = _overlay_key()
+    lut = _overlay_luts.get(key)
+    if lut is None:
+        ramp = Image.new('L', (256, 1))
+        ramp.putdata(range(256))
+        ramp = Image.merge('RGBA', (ramp, ramp, ramp, Image.new('L', (256, 1), 255)))
+        ramp = apply_overlay(ramp, CONFIG['overlay_1_color'], CONFIG['overlay_1_opacity'])
+        ramp = apply_overlay(ramp, CONFIG['overlay_2_color'], CONFIG['overlay_2_opacity'])
+        lut = tuple(list(band.getdata()) for band in ramp.split()[:3])
+        _overlay_luts[key] = lut
+    return lut
+
+
+def apply_overlays(image):
+    """Darken with both configured overlays in one pass, without overlay images.
+
+    Opaque L and RGB images go through the precomputed LUT (L stays one
+    band until the three output bands are produced); images with alpha
+    fall back to compositing.
+    """
+    if image.mode == 'L':
+        red, green, blue = overlay_lut()
+        return Image.merge('RGB', (image.point(red), image.point(green), image.point(blue)))
+    if image.mode == 'RGB':
+        red, green, blue = overlay_lut()
+        return image.point(red + green + blue)
+
+    image = apply_overlay(image, CONFIG['overlay_1_color'], CONFIG['overlay_1_opacity'])
+    return apply_overlay(image, CONFIG['overlay_2_color'], CONFIG['overlay_2_opacity'])
+
+
+def crop_box(image_size, width, height):
+    """Centered box of an image_size image with the width:height aspect ratio."""
+    image_width, image_height = image_size
+    target_ratio = width / height
+    current_ratio = image_width / image_height
+
+    if current_ratio > target_ratio:
+        new_width = int(image_height * target_ratio)
+        left = (image_width - new_width) // 2
+        return (left, 0, left + new_width, image_height)
+
+    new_height = int(image_width / target_ratio)
+    top = (image_height - new_height) // 2
+    return (0, top, image_width, top + new_height)
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+
+def _requested_size(full_size, size):
+    """Decode size at which the crop for ``size`` comes out exactly ``size``."""
+    box = crop_box(full_size, *size)
+    return (
+        math.ceil(full_size[0] * size[0] / (box[2] - box[0])),
+        math.ceil(full_size[1] * size[1] / (box[3] - box[1])),
+    )
+
+
+def _undersized(image_size, size):
+    box = crop_box(image_size, *size)
+    return box[2] - box[0] < size[0] or box[3] - box[1] < size[1]
+
+
+def open_background(background_bytes, sizes, grayscale=True):
+    """Decode a background once, at a resolution that serves every size.
+
+    JPEGs are decoded with DCT scaling (Image.draft) at the smallest
+    reduction that still leaves each size's cropped region at least that
+    size, and straight to L when the output is grayscale.
+    """
+    with stage('decode'):
+        bg = Image.open(io.BytesIO(background_bytes))
+        full_size = bg.size
+        drafted = False
+        if bg.format == 'JPEG':
+            requests = [_requested_size(full_size, size) for size in sizes]
+            requested = (max(r[0] for r in requests), max(r[1] for r in requests))
+            drafted = bg.draft('L' if grayscale else 'RGB', requested) is not None
+
+        # Quality guard: never let LANCZOS upsample a region that was reduced
+        if drafted and bg.size != full_size and any(_undersized(bg.size, size) for size in sizes):
+            bg = Image.open(io.BytesIO(background_bytes))
+        bg.load()
+    return bg
+
+
+def fit_background(bg, size):
+    """Center crop and LANCZOS resize a decoded background to ``size``.
+
+    The crop and the resize happen in one pass on the native mode, and
+    conversion happens at the output size.
+    """
+    width, height = size
+    with stage('crop+resize'):
+        box = crop_box(bg.size, width, height)
+        if bg.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            # Palette, CMYK and 16-bit images cannot be resampled directly
+            bg = bg.crop(box).convert('RGBA' if _has_alpha(bg) else 'RGB')
+            box = None
+        return bg.resize((width, height), Image.Resampling.LANCZOS, box=box)
+
+
+def decode_background(background_bytes, size, grayscale=True):
+    """Decode just enough of a background to produce a ``size`` base."""
+    return fit_background(open_background(background_bytes, [size], grayscale), size)
+
+
+def finish_background(bg, grayscale=True):
+    """Grayscale (if asked) and overlay a cropped, resized background."""
+    if grayscale and bg.mode != 'L':
+        with stage('grayscale'):
+            bg = ImageOps.grayscale(bg)
+
+    with stage('overlays'):
+        return apply_overlays(bg)
+
+
+def prepare_background(background_bytes, size, grayscale=True):
+    """Decode a background and return the cropped, resized, overlaid base.
+
+    The base is RGB, or RGBA for backgrounds with transparency.
+    """
+    return finish_background(decode_background(background_bytes, size, grayscale), grayscale)
+
+
+def prepare_backgrounds(background_bytes, sizes, grayscale=True):
+    """Prepare bases for several output sizes from a single decode."""
+    source = open_background(background_bytes, sizes, grayscale)
+    return {
+        tuple(size): finish_background(fit_background(source, size), grayscale)
+        for size in sizes
+    }
+
+
+def _overlay_key():
+    return (
+        CONFIG['overlay_1_color'], CONFIG['overlay_1_opacity'],
+        CONFIG['overlay_2_color'], CONFIG['overlay_2_opacity'],
+    )
+
+
+def _base_key(digest, size, grayscale):
+    return (digest, tuple(size), bool(grayscale), _overlay_key())
+
+
+def _image_nbytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+class BackgroundCache:
+    """LRU cache of prepared backgrounds, bounded by total pixel bytes.
+
+    Entries are keyed by (content hash, size, grayscale, overlay settings).
+    Callers get a private copy they are free to draw on.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, background_bytes, size, grayscale=True, digest=None):
+        """Return a copy of the prepared base, building it on a miss."""
+        if digest is None:
+            with stage('hash'):
+                digest = content_hash(background_bytes)
+        key = _base_key(digest, size, grayscale)
+
+        with self._lock:
+            base = self._entries.get(key)
+            if base is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if base is None:
+            # Build outside the lock so other threads are not blocked on decode
+            base = prepare_background(background_bytes, size, grayscale=grayscale)
+            self._put(key, base)
+
+        with stage('base copy'):
+            return base.copy()
+
+    def prefetch(self, background_bytes, sizes, grayscale=True, digest=None):
+        """Build every size not cached yet from one decode; returns how many.
+
+        Does nothing if the bases would not all fit in the cache together:
+        they would evict each other before use, and get() builds them one
+        at a time anyway.
+        """
+        if sum(width * height * 4 for width, height in sizes) > self.max_bytes:
+            return 0
+        if digest is None:
+            digest = content_hash(background_bytes)
+        keys = {tuple(size): _base_key(digest, size, grayscale) for size in sizes}
+
+        with self._lock:
+            missing = [size for size, key in keys.items() if key not in self._entries]
+            self.misses += len(missing)
+        if not missing:
+            return 0
+
+        bases = prepare_backgrounds(background_bytes, missing, grayscale=grayscale)
+        for size, base in bases.items():
+            self._put(keys[size], base)
+        return len(missing)
+
+    def _put(self, key, base):
+        nbytes = _image_nbytes(base)
+        with self._lock:
+            if nbytes > self.max_bytes:
+                return
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = base
+            self.current_bytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, old = self._entries.popitem(last=False)
+            self.current_bytes -= _image_nbytes(old)
+
+    def resize(self, max_bytes):
+        """Change the memory bound, evicting entries if it shrank."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Process-wide cache; survives Streamlit reruns because modules are imported once
+background_cache = BackgroundCache()
@@ -0,0 +1,390 @@
+"""
+Batch rendering engine.
+Fans generate_image() plus encoding out across a process pool and
+streams encoded results back in job order.
+"""
+
+import os
+import sys
+import threading
+import tracemalloc
+import types
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from multiprocessing.context import SpawnContext, SpawnProcess
+
+from .backgrounds import background_cache
+from .config import CONFIG, profile_config
+from .encoders import DEFAULT_ENCODER, make_encoder
+from .icons import get_icon, install_icon
+from .memory import cache_floor, trim_caches
+from .pairing import DEFAULT_PAIRING_MODE, iter_pairing
+from .previews import make_thumbnail
+from .profiling import StageProfiler, current_rss, stage
+from .render import generate_image, sanitize_filename
+from .render_cache import render_fingerprint, render_key
+
+RenderJob = namedtuple('RenderJob', 'index filename quote saint background_key profile', defaults=(None,))
+RenderResult = namedtuple(
+    'RenderResult', 'index filename data error profile cached thumbnail', defaults=(None, False, None)
+)
+
+# Jobs regrouped by background at a time when streaming (see iter_grouped)
+GROUP_WINDOW = 500
+
+
+def default_workers():
+    """Leave a core for the Streamlit server, capped at 4 workers."""
+    return max(1, min(4, (os.cpu_count() or 1) - 1))
+
+
+def iter_jobs(
+    quotes,
+    background_keys=None,
+    seed=None,
+    mode=DEFAULT_PAIRING_MODE,
+    names=None,
+    profiles=None,
+    extension='.jpg',
+    report=None
+):
+    """Yield the jobs build_jobs would return, reading ``quotes`` lazily."""
+    profiles = list(profiles or [None])
+    pairing = iter_pairing(quotes, background_keys, seed=seed, mode=mode, names=names, report=report)
+    index = 0
+    for i, (quote_data, background_key) in enumerate(pairing):
+        saint_name = quote_data.get('saint', 'Unknown Saint')
+        filename = f"{sanitize_filename(saint_name)}_{i+1:03d}{extension}"
+        for profile in profiles:
+            yield RenderJob(
+                index=index,
+                filename=f"{profile}/{filename}" if len(profiles) > 1 else filename,
+                quote=quote_data.get('text', ''),
+                saint=saint_name,
+                background_key=background_key,
+                profile=profile
+            )
+            index += 1
+
+
+def build_jobs(
+    quotes,
+    background_keys=None,
+    seed=None,
+    mode=DEFAULT_PAIRING_MODE,
+    names=None,
+    profiles=None,
+    extension='.jpg',
+    report=None
+):
+    """Pair each quote with a background and its output filename.
+
+    ``background_keys`` is empty or None for solid color batches. Pairing
+    is reproducible for a given ``seed``; see pair_backgrounds.
+
+    With several output ``profiles`` (see OUTPUT_PROFILES) each quote gets
+    one job per profile, on the same background, filed in a folder named
+    after the profile. ``extension`` should match the renderer's encoder.
+    Pins to missing backgrounds are noted in ``report`` (a QuoteReport) if
+    given, and raise ValueError otherwise.
+    """
+    return list(iter_jobs(quotes, background_keys, seed, mode, names, profiles, extension, report))
+
+
+def group_by_background(jobs):
+    """Reorder jobs so every quote sharing a background renders back to back.
+
+    Groups follow the order each background first appears and keep job
+    order within a group. Filenames are untouched, so only the order
+    results arrive in changes; each prepared base is then needed for one
+    stretch of the batch, and even a one-entry cache rebuilds it only once.
+    """
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.background_key, []).append(job)
+    return [job for group in groups.values() for job in group]
+
+
+def iter_grouped(jobs, window=GROUP_WINDOW):
+    """group_by_background over consecutive runs of ``window`` jobs.
+
+    For job streams too long to hold: each base is built at most once per
+    window instead of once per batch, and the first results arrive after
+    ``window`` jobs have been read rather than all of them.
+    """
+    chunk = []
+    for job in jobs:
+        chunk.append(job)
+        if len(chunk) >= window:
+            yield from group_by_background(chunk)
+            chunk = []
+    yield from group_by_background(chunk)
+
+
+# =============================================================================
+# RENDERER
+# =============================================================================
+
+class BatchRenderer:
+    """Everything that stays fixed across a batch, shipped to each worker once.
+
+    Includes the pre-rasterized icon, which workers install into their own
+    icon cache on start-up.
+    """
+
+    def __init__(
+        self,
+        bold_font_bytes,
+        light_font_bytes,
+        backgrounds=None,
+        solid_color=None,
+        grayscale=True,
+        grain_image=None,
+        grain_intensity=0.5,
+        jpeg_quality=92,
+        profile=False,
+        auto_fit=False,
+        profiles=None,
+        encoder=None,
+        thumbnails=False
+    ):
+        self.bold_font_bytes = bold_font_bytes
+        self.light_font_bytes = light_font_bytes
+        self.backgrounds = backgrounds or {}
+        self.solid_color = solid_color
+        self.grayscale = grayscale
+        self.grain_image = grain_image
+        self.grain_intensity = grain_intensity
+        self.jpeg_quality = jpeg_quality
+        # Any daily_saint.encoders encoder; plain JPEG at jpeg_quality by default
+        self.encoder = encoder or make_encoder(DEFAULT_ENCODER, quality=jpeg_quality)
+        # Also return a small preview JPEG made from the image before it is dropped
+        self.thumbnails = thumbnails
+        self.profile = profile
+        self.auto_fit = auto_fit
+        self.profiles = list(profiles or [])
+        # Every size a background is needed at, prepared together from one decode
+        self.base_sizes = [
+            (config['output_width'], config['output_height'])
+            for config in map(profile_config, self.profiles)
+        ]
+
+        # Rasterize the icon here so workers never touch cairo
+        self.icon_scale = CONFIG['icon_scale']
+        self.icon = get_icon(self.icon_scale)[0]
+
+    def render(self, job):
+        """Render and encode one job, reporting failures instead of raising."""
+        profiler = StageProfiler() if self.profile else None
+        try:
+            with profiler.activate() if profiler else nullcontext():
+                background_bytes = self.backgrounds.get(job.background_key)
+                if background_bytes is not None and len(self.base_sizes) > 1:
+                    background_cache.prefetch(
+                        background_bytes, self.base_sizes, self.grayscale, job.background_key
+                    )
+                img = generate_image(
+                    quote=job.quote,
+                    saint_name=job.saint,
+                    background_bytes=background_bytes,
+                    solid_color=self.solid_color,
+                    grayscale=self.grayscale,
+                    bold_font_bytes=self.bold_font_bytes,
+                    light_font_bytes=self.light_font_bytes,
+                    grain_image=self.grain_image,
+                    grain_intensity=self.grain_intensity,
+                    background_key=job.background_key,
+                    auto_fit=self.auto_fit,
+                    config=profile_config(job.profile)
+                )
+                with stage('encode'):
+                    data = self.encoder.encode(img)
+                thumbnail = None
+                if self.thumbnails:
+                    with stage('thumbnail'):
+                        thumbnail = make_thumbnail(img)
+        except Exception as e:
+            return RenderResult(job.index, job.filename, None, str(e))
+        records = profiler.records if profiler else None
+        return RenderResult(job.index, job.filename, data, None, records, thumbnail=thumbnail)
+
+
+# =============================================================================
+# WORKER PROCESS
+# =============================================================================
+
+_worker_renderer = None
+_worker_memory_limit = None
+_worker_cache_floor = None
+
+
+def _init_worker(renderer, cache_floor, cache_bytes=None, memory_limit=None):
+    global _worker_renderer, _worker_memory_limit, _worker_cache_floor
+    _worker_renderer = renderer
+    _worker_memory_limit = memory_limit
+    _worker_cache_floor = cache_floor
+    install_icon(renderer.icon_scale, renderer.icon)
+    if cache_bytes is not None:
+        background_cache.resize(cache_bytes)
+    if renderer.profile:
+        tracemalloc.start()
+
+
+def _render_in_worker(job):
+    result = _worker_renderer.render(job)
+    if _worker_memory_limit is not None and (current_rss() or 0) > _worker_memory_limit:
+        trim_caches(_worker_cache_floor)
+    return result
+
+
+# =============================================================================
+# BATCH
+# =============================================================================
+
+_main_lock = threading.Lock()
+
+
+@contextmanager
+def _bare_main():
+    """Hide the parent's ``__main__`` while a worker is spawned.
+
+    Spawn re-runs the main script in every child when ``__main__`` has a
+    ``__file__``. Under ``streamlit run`` that is the app itself, so each
+    worker would import Streamlit and execute the whole page. Workers only
+    need this package, which they import by name.
+    """
+    with _main_lock:
+        main = sys.modules['__main__']
+        bare = types.ModuleType('__main__')
+        sys.modules['__main__'] = bare
+        try:
+            yield
+        finally:
+            # Leave it alone if something else replaced it meanwhile
+            if sys.modules.get('__main__') is bare:
+                sys.modules['__main__'] = main
+
+
+class _WorkerProcess(SpawnProcess):
+    def start(self):
+        # The pool starts workers lazily, on submit, so guard every start
+        with _bare_main():
+            super().start()
+
+
+class _WorkerContext(SpawnContext):
+    Process = _WorkerProcess
+
+
+def _start_pool(renderer, workers, budget=None):
+    floor = cache_floor(renderer.base_sizes)
+    initargs = (renderer, floor)
+    if budget is not None:
+        initargs += (budget.cache_bytes(workers + 1, floor), budget.worker_limit(workers))
+
+    # Spawn rather than fork: the Streamlit server process is multithreaded
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_WorkerContext(),
+        initializer=_init_worker,
+        initargs=initargs
+    )
+
+
+def render_batch(renderer, jobs, workers=1, max_in_flight=None, cache=None, budget=None):
+    """Yield a RenderResult per job, in job order.
+
+    With ``workers`` > 1 jobs run in a spawned process pool; at most
+    ``max_in_flight`` jobs (default: twice the worker count) are queued at
+    once so finished JPEGs are handed back as soon as they are next in line.
+    With a RenderCache, unchanged jobs are served from disk (``cached`` is
+    set on their results), fresh renders are stored, and the pool is only
+    started if something actually needs rendering.
+
+    With a MemoryBudget, base caches are sized to the budget up front.
+    Above its high-water mark the in-flight limit halves and caches are
+    trimmed; over the budget with one job in flight, the pool is shut down
+    and the rest of the batch renders in this process.
+    """
+    fingerprint = render_fingerprint(renderer) if cache is not None else None
+
+    def lookup(job):
+        if cache is None:
+            return None
+        data = cache.get(render_key(fingerprint, job))
+        if data is None:
+            return None
+        return RenderResult(job.index, job.filename, data, None, None, True)
+
+    def store(job, result):
+        if cache is not None and result.data is not None and not result.cached:
+            cache.put(render_key(fingerprint, job), result.data)
+        return result
+
+    jobs = iter(jobs)
+    processes = workers + 1 if workers > 1 else 1
+    # Room for one base of every format, which a background's jobs alternate between
+    floor = cache_floor(renderer.base_sizes)
+    with budget.limit_caches(processes, floor) if budget is not None else nullcontext():
+        if workers > 1:
+            yield from _render_pooled(renderer, jobs, workers, max_in_flight, lookup, store, budget, floor)
+
+        # Sequential batches, and whatever is left if the pool was given up
+        for job in jobs:
+            yield lookup(job) or store(job, renderer.render(job))
+            if budget is not None:
+                usage = budget.usage()
+                if budget.over_high_water(usage) and trim_caches(floor):
+                    budget.note(usage, f"trimmed cached backgrounds to {background_cache.max_bytes // (1024 * 1024)} MB")
+
+
+def _render_pooled(renderer, jobs, workers, max_in_flight, lookup, store, budget, floor):
+    """Pool half of render_batch. Returns early, leaving the rest of ``jobs``
+    to the caller, if the memory budget cannot be met with the pool running."""
+    if max_in_flight is None:
+        max_in_flight = workers * 2
+
+    def collect():
+        job, item = pending.popleft()
+        return store(job, item if isinstance(item, RenderResult) else item.result())
+
+    pool = None
+    pending = deque()
+    try:
+        for job in jobs:
+            hit = lookup(job)
+            if hit is None:
+                if pool is None:
+                    pool = _start_pool(renderer, workers, budget)
+                hit = pool.submit(_render_in_worker, job)
+            pending.append((job, hit))
+
+            # Hand back cached results at the head right away
+            while pending and (len(pending) >= max_in_flight or isinstance(pending[0][1], RenderResult)):
+                yield collect()
+
+                if budget is None:
+                    continue
+                usage = budget.usage()
+                if budget.over_limit(usage) and max_in_flight == 1 and pool is not None:
+                    while pending:
+                        yield collect()
+                    pool.shutdown(wait=True)
+                    pool = None
+                    trim_caches(floor)
+                    budget.note(usage, "stopped the worker pool, rendering in-process")
+                    return
+                if budget.over_high_water(usage) and max_in_flight > 1:
+                    max_in_flight //= 2
+                    trim_caches(floor)
+                    budget.note(usage, f"limited renders in flight to {max_in_flight}")
+
+        while pending:
+            yield collect()
+    finally:
+        for _, item in pending:
+            if not isinstance(item, RenderResult):
+                item.cancel()
+        if pool is not None:
+            pool.shutdown(wait=True)
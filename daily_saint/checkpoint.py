@@ -0,0 +1,195 @@
+"""
+Batch checkpoints.
+A checkpointed batch keeps its job manifest and every finished image in a
+directory on disk, so a batch cut short by a dropped session or a killed
+process resumes at the first unfinished quote. The archive is assembled
+from those files.
+
+Layout of a checkpoint directory:
+
+    manifest.json   settings fingerprint, caller info and the job list
+    progress.log    index of each finished job, one per line
+    images/         the finished images, named by job index; output
+                    filenames are only used in the archive
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+
+from .batch import RenderJob
+from .output import OUTPUT_DIR
+
+CHECKPOINT_DIR = os.path.join(OUTPUT_DIR, 'batches')
+MAX_CHECKPOINT_AGE = 24 * 60 * 60
+
+MANIFEST_NAME = 'manifest.json'
+PROGRESS_NAME = 'progress.log'
+CHECKPOINT_VERSION = 2
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.part"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class BatchCheckpoint:
+    """A batch's manifest and finished outputs on disk.
+
+    Images are written before their index is logged, and each is renamed
+    into place, so the log never names a missing or partial file. Nothing
+    is fsynced: this survives a killed process, not a power cut.
+    """
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self.jobs = [RenderJob(**job) for job in manifest['jobs']]
+        self._done = None
+
+    @classmethod
+    def create(cls, jobs, fingerprint, info=None, directory=None):
+        """Start a checkpoint for ``jobs`` rendered with ``fingerprint`` settings.
+
+        ``info`` is free-form JSON for the caller, e.g. archive format or
+        background names, shown when offering to resume.
+        """
+        if directory is None:
+            stamp = time.strftime('%Y%m%d_%H%M%S')
+            directory = os.path.join(CHECKPOINT_DIR, f"{stamp}_{uuid.uuid4().hex[:8]}")
+        os.makedirs(os.path.join(directory, 'images'), exist_ok=True)
+
+        manifest = {
+            "version": CHECKPOINT_VERSION,
+            "created": time.time(),
+            "fingerprint": fingerprint,
+            "info": info or {},
+            "jobs": [job._asdict() for job in jobs],
+        }
+        _write_atomic(os.path.join(directory, MANIFEST_NAME), json.dumps(manifest).encode())
+        return cls(directory, manifest)
+
+    @classmethod
+    def load(cls, directory):
+        """Open an existing checkpoint; ValueError if it is missing or unreadable."""
+        try:
+            with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"No usable checkpoint in {directory}: {e}") from e
+        if manifest.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"Checkpoint in {directory} is from an incompatible version")
+        return cls(directory, manifest)
+
+    @property
+    def id(self):
+        return os.path.basename(os.path.normpath(self.directory))
+
+    @property
+    def fingerprint(self):
+        return self.manifest['fingerprint']
+
+    @property
+    def info(self):
+        return self.manifest['info']
+
+    def _image_path(self, index, filename):
+        # Never the filename itself: it comes from the quotes file
+        extension = os.path.splitext(filename)[1]
+        return os.path.join(self.directory, 'images', f"{index:06d}{extension}")
+
+    def completed(self):
+        """Indices of finished jobs."""
+        if self._done is None:
+            done = set()
+            try:
+                with open(os.path.join(self.directory, PROGRESS_NAME), encoding='utf-8') as f:
+                    for line in f:
+                        # A kill can leave the last line without its newline
+                        if line.endswith('\n') and line.strip().isdigit():
+                            done.add(int(line))
+            except OSError:
+                pass
+            self._done = done
+        return self._done
+
+    def pending(self):
+        """Jobs still to render, in manifest order."""
+        done = self.completed()
+        return [job for job in self.jobs if job.index not in done]
+
+    def is_complete(self):
+        return len(self.completed()) == len(self.jobs)
+
+    def record(self, result):
+        """Store a successful RenderResult and mark its job finished."""
+        _write_atomic(self._image_path(result.index, result.filename), result.data)
+        with open(os.path.join(self.directory, PROGRESS_NAME), 'a', encoding='utf-8') as f:
+            f.write(f"{result.index}\n")
+        self.completed().add(result.index)
+
+    def read_image(self, job):
+        with open(self._image_path(job.index, job.filename), 'rb') as f:
+            return f.read()
+
+    def assemble(self, sink):
+        """Add every finished image to ``sink`` in original quote order."""
+        done = self.completed()
+        for job in sorted(self.jobs, key=lambda job: job.index):
+            if job.index in done:
+                sink.add(job.filename, self.read_image(job))
+        return sink
+
+    def status(self):
+        return {
+            "id": self.id,
+            "created": self.manifest['created'],
+            "done": len(self.completed()),
+            "total": len(self.jobs),
+            "info": self.info,
+        }
+
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def list_checkpoints(directory=CHECKPOINT_DIR, unfinished_only=True):
+    """Checkpoints under ``directory``, newest first; unreadable ones are skipped."""
+    if not os.path.isdir(directory):
+        return []
+    checkpoints = []
+    for name in os.listdir(directory):
+        try:
+            checkpoint = BatchCheckpoint.load(os.path.join(directory, name))
+        except ValueError:
+            continue
+        if unfinished_only and checkpoint.is_complete():
+            continue
+        checkpoints.append(checkpoint)
+    checkpoints.sort(key=lambda checkpoint: checkpoint.manifest['created'], reverse=True)
+    return checkpoints
+
+
+def cleanup_checkpoints(directory=CHECKPOINT_DIR, max_age=MAX_CHECKPOINT_AGE, keep=()):
+    """Delete checkpoints untouched for ``max_age`` seconds, except ids in ``keep``."""
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name in keep or not os.path.isdir(path):
+            continue
+        progress = os.path.join(path, PROGRESS_NAME)
+        try:
+            touched = os.path.getmtime(progress if os.path.exists(progress) else path)
+        except OSError:
+            continue
+        if touched < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
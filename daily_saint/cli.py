@@ -0,0 +1,289 @@
+"""
+Headless batch generation.
+
+    python -m daily_saint --quotes quotes.json --backgrounds photos/ \
+        --bold-font Bold.ttf --light-font Light.ttf --output out.zip
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from .backgrounds import content_hash
+from .batch import (
+    BatchRenderer,
+    build_jobs,
+    default_workers,
+    group_by_background,
+    iter_grouped,
+    iter_jobs,
+    render_batch,
+)
+from .checkpoint import MANIFEST_NAME, BatchCheckpoint
+from .config import DEFAULT_PROFILE, OUTPUT_PROFILES
+from .encoders import DEFAULT_ENCODER, ENCODERS, make_encoder
+from .grain import load_grain_image
+from .memory import MemoryBudget, default_budget
+from .output import ARCHIVE_MODES, DEFAULT_ARCHIVE_MODE, format_report, open_sink
+from .pairing import DEFAULT_PAIRING_MODE, PAIRING_MODES, new_seed, pairing_manifest
+from .quotes import QuoteReport, quote_extensions, quote_format, stream_quotes
+from .render_cache import RenderCache, render_fingerprint
+
+BACKGROUND_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def read_backgrounds(directory):
+    """Read every background image in a directory, keyed by content hash.
+
+    Also returns the file name to key mapping used for pinned backgrounds.
+    """
+    backgrounds = {}
+    names = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(BACKGROUND_EXTENSIONS):
+            with open(os.path.join(directory, name), 'rb') as f:
+                data = f.read()
+            key = content_hash(data)
+            backgrounds[key] = data
+            names[name] = key
+    return backgrounds, names
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='daily_saint',
+        description="Batch generate Instagram-ready saint quote images."
+    )
+    parser.add_argument(
+        '--quotes',
+        required=True,
+        help=f"Quotes file ({', '.join(quote_extensions())}); read as it renders"
+    )
+    parser.add_argument('--backgrounds', help="Directory of background images")
+    parser.add_argument('--solid-color', help="Use a solid background color, e.g. #1a1a1a")
+    parser.add_argument('--bold-font', required=True, help="Font for quotes (TTF/OTF)")
+    parser.add_argument('--light-font', required=True, help="Font for attribution (TTF/OTF)")
+    parser.add_argument(
+        '--pairing',
+        choices=list(PAIRING_MODES),
+        default=DEFAULT_PAIRING_MODE,
+        help="How quotes are paired with backgrounds (default: %(default)s)"
+    )
+    parser.add_argument('--seed', type=int, help="Pairing seed; reuse one to regenerate identical output")
+    parser.add_argument('--manifest', help="Write the pairing manifest (JSON) to this file")
+    parser.add_argument('--grain', help="Optional film grain texture")
+    parser.add_argument('--grain-intensity', type=float, default=0.5)
+    parser.add_argument('--color', action='store_true', help="Keep backgrounds in color")
+    parser.add_argument(
+        '--formats',
+        default=DEFAULT_PROFILE,
+        help=f"Comma-separated output formats: {', '.join(OUTPUT_PROFILES)} (default: %(default)s)"
+    )
+    parser.add_argument('--auto-fit', action='store_true', help="Size each quote to fill the text area")
+    parser.add_argument(
+        '--encoding',
+        choices=list(ENCODERS),
+        default=DEFAULT_ENCODER,
+        help="Image encoding (default: %(default)s)"
+    )
+    parser.add_argument('--quality', type=int, default=92, help="Quality for lossy encodings (default: %(default)s)")
+    parser.add_argument(
+        '--max-kb',
+        type=int,
+        help="Use the highest quality whose file fits this many KB (lossy encodings only)"
+    )
+    parser.add_argument(
+        '--archive',
+        choices=list(ARCHIVE_MODES),
+        default=DEFAULT_ARCHIVE_MODE,
+        help="Output format (default: %(default)s)"
+    )
+    parser.add_argument('--output', help="Archive file or folder (default: timestamped name)")
+    parser.add_argument('--workers', type=int, default=default_workers())
+    parser.add_argument(
+        '--memory-budget',
+        type=int,
+        help="Memory budget in MB; 0 for no limit (default: 75%% of available memory)"
+    )
+    parser.add_argument(
+        '--checkpoint',
+        help="Directory to checkpoint finished images in; rerun with the same directory to resume"
+    )
+    parser.add_argument('--no-cache', action='store_true', help="Render every image instead of reusing cached renders")
+    parser.add_argument('--quiet', action='store_true', help="Only print errors and the summary")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if not args.backgrounds and not args.solid_color:
+        parser.error("either --backgrounds or --solid-color is required")
+
+    profiles = [name for name in args.formats.split(',') if name]
+    unknown = [name for name in profiles if name not in OUTPUT_PROFILES]
+    if unknown or not profiles:
+        parser.error(f"unknown format(s) {', '.join(unknown)}; choose from {', '.join(OUTPUT_PROFILES)}")
+
+    try:
+        encoder = make_encoder(
+            args.encoding,
+            quality=args.quality,
+            max_bytes=args.max_kb * 1024 if args.max_kb else None
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    try:
+        quote_format(args.quotes)
+    except ValueError as e:
+        parser.error(str(e))
+    quote_report = QuoteReport()
+    quotes = stream_quotes(args.quotes, quote_report)
+    backgrounds, names = ({}, {}) if args.solid_color else read_backgrounds(args.backgrounds)
+    if not args.solid_color and not backgrounds:
+        parser.error(f"no background images found in {args.backgrounds}")
+
+    grain_image = None
+    if args.grain:
+        grain_image = load_grain_image(args.grain)
+
+    output = args.output
+    if output is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = f"daily_saint_{timestamp}{ARCHIVE_MODES[args.archive][1]}"
+
+    renderer = BatchRenderer(
+        bold_font_bytes=read_bytes(args.bold_font),
+        light_font_bytes=read_bytes(args.light_font),
+        backgrounds=backgrounds,
+        solid_color=args.solid_color,
+        grayscale=not args.color,
+        grain_image=grain_image,
+        grain_intensity=args.grain_intensity,
+        auto_fit=args.auto_fit,
+        profiles=profiles,
+        encoder=encoder
+    )
+
+    checkpoint = None
+    total = None
+    if args.checkpoint and os.path.exists(os.path.join(args.checkpoint, MANIFEST_NAME)):
+        # Resuming: the jobs (and so the pairing) come from the checkpoint
+        try:
+            checkpoint = BatchCheckpoint.load(args.checkpoint)
+        except ValueError as e:
+            parser.error(str(e))
+        if checkpoint.fingerprint != render_fingerprint(renderer):
+            parser.error("the checkpoint was made with different fonts, grain or options")
+        seed = checkpoint.info.get('seed')
+        jobs = checkpoint.pending()
+        total = len(jobs)
+        missing = {job.background_key for job in jobs} - set(backgrounds) - {None}
+        if missing:
+            parser.error(f"{len(missing)} background(s) used by the checkpoint are not in {args.backgrounds}")
+        if not args.quiet:
+            print(f"Resuming {args.checkpoint}: {len(checkpoint.completed())}/{len(checkpoint.jobs)} already done")
+    elif args.checkpoint or args.manifest:
+        # Both need every job up front; quotes are still read one at a time
+        seed = new_seed() if args.seed is None else args.seed
+        jobs = build_jobs(
+            quotes,
+            list(backgrounds),
+            seed=seed,
+            mode=args.pairing,
+            names=names,
+            profiles=profiles,
+            extension=encoder.extension,
+            report=quote_report
+        )
+        if args.manifest:
+            with open(args.manifest, 'w', encoding='utf-8') as f:
+                json.dump(pairing_manifest(jobs, seed, args.pairing, names), f, indent=2)
+        # Render each background's quotes together so its base is prepared once
+        jobs = group_by_background(jobs)
+        total = len(jobs)
+        if args.checkpoint:
+            checkpoint = BatchCheckpoint.create(
+                jobs, render_fingerprint(renderer), info={"seed": seed}, directory=args.checkpoint
+            )
+    else:
+        # Streamed: rendering starts with the first quotes read, grouped by
+        # background a window at a time
+        seed = new_seed() if args.seed is None else args.seed
+        jobs = iter_grouped(iter_jobs(
+            quotes,
+            list(backgrounds),
+            seed=seed,
+            mode=args.pairing,
+            names=names,
+            profiles=profiles,
+            extension=encoder.extension,
+            report=quote_report
+        ))
+
+    cache = None if args.no_cache else RenderCache()
+    if args.memory_budget is None:
+        budget_bytes = default_budget()
+    else:
+        budget_bytes = args.memory_budget * 1024 * 1024
+    budget = MemoryBudget(budget_bytes) if budget_bytes else None
+
+    start = time.perf_counter()
+    errors = 0
+    oversized = 0
+    with open_sink(args.archive, output) as sink:
+        results = render_batch(renderer, jobs, workers=args.workers, cache=cache, budget=budget)
+        for done, result in enumerate(results, start=1):
+            if result.error:
+                errors += 1
+                print(f"Error on image {result.index+1}: {result.error}", file=sys.stderr)
+            else:
+                oversized += encoder.over_target(result.data)
+                if checkpoint is not None:
+                    checkpoint.record(result)
+                else:
+                    sink.add(result.filename, result.data)
+
+            if not args.quiet and (done % 50 == 0 or done == total):
+                print(f"Generated {done}/{total}" if total else f"Generated {done}")
+
+        if checkpoint is not None:
+            # The archive is assembled from the checkpointed files, in quote order
+            checkpoint.assemble(sink)
+    if checkpoint is not None and checkpoint.is_complete():
+        checkpoint.remove()
+
+    elapsed = time.perf_counter() - start
+    if not quote_report.ok:
+        print(f"Quotes: {quote_report.summary()}", file=sys.stderr)
+        for where, reason in quote_report.problems:
+            print(f"  {where}: {reason}", file=sys.stderr)
+        if quote_report.unlisted:
+            print(f"  ...and {quote_report.unlisted} more", file=sys.stderr)
+    if budget is not None:
+        for event in budget.events:
+            print(event, file=sys.stderr)
+    if oversized:
+        print(
+            f"{oversized} image(s) are over {args.max_kb} KB even at the lowest quality",
+            file=sys.stderr
+        )
+    rate = sink.count / elapsed if elapsed else 0.0
+    print(f"Wrote {sink.count} images to {sink.path} in {elapsed:.1f}s ({rate:.1f} images/s)")
+    print(format_report(sink.report()))
+    if backgrounds and seed is not None:
+        print(f"Pairing seed {seed}")
+    if cache is not None:
+        print(f"Reused {cache.hits} cached images, rendered {cache.misses}")
+        cache.prune()
+    return 1 if errors or not quote_report.ok else 0
@@ -0,0 +1,59 @@
+"""
+Fixed rendering configuration and embedded assets.
+"""
+
+# =============================================================================
+# EMBEDDED ASSETS
+# =============================================================================
+
+ICON_SVG = '''<svg width="21" height="28" viewBox="0 0 21 28" fill="none" xmlns="http://www.w3.org/2000/svg">
+<path d="M1.23137 11.698V12.0059C1.23137 12.6859 1.78272 13.2373 2.46274 13.2373C3.14277 13.2373 3.69412 12.6859 3.69412 12.0059V11.698H9.23529V24.0118H8.92745C8.24742 24.0118 7.69608 24.5631 7.69608 25.2431C7.69608 25.9232 8.24742 26.4745 8.92745 26.4745H9.23529C9.23529 27.1545 9.78664 27.7059 10.4667 27.7059C11.1467 27.7059 11.698 27.1545 11.698 26.4745H12.0059C12.6859 26.4745 13.2373 25.9232 13.2373 25.2431C13.2373 24.5631 12.6859 24.0118 12.0059 24.0118H11.698V11.698H17.2392V12.0059C17.2392 12.6859 17.7906 13.2373 18.4706 13.2373C19.1506 13.2373 19.702 12.6859 19.702 12.0059V11.698C20.382 11.698 20.9333 11.1467 20.9333 10.4667C20.9333 9.78664 20.382 9.23529 19.702 9.23529V8.92745C19.702 8.24743 19.1506 7.69608 18.4706 7.69608C17.7906 7.69608 17.2392 8.24743 17.2392 8.92745V9.23529H11.698V3.69412H12.0059C12.6859 3.69412 13.2373 3.14277 13.2373 2.46275C13.2373 1.78272 12.6859 1.23137 12.0059 1.23137H11.698C11.698 0.551347 11.1467 0 10.4667 0C9.78664 0 9.23529 0.551347 9.23529 1.23137H8.92745C8.24742 1.23137 7.69608 1.78272 7.69608 2.46275C7.69608 3.14277 8.24742 3.69412 8.92745 3.69412H9.23529V9.23529H3.69412V8.92745C3.69412 8.24743 3.14277 7.69608 2.46274 7.69608C1.78272 7.69608 1.23137 8.24743 1.23137 8.92745V9.23529C0.551347 9.23529 0 9.78664 0 10.4667C0 11.1467 0.551347 11.698 1.23137 11.698Z" fill="white"/>
+</svg>'''
+
+# =============================================================================
+# FIXED CONFIGURATION
+# =============================================================================
+
+CONFIG = {
+    "output_width": 1080,
+    "output_height": 1350,
+    "text_color": "#FFF4EF",
+    "overlay_1_color": (39, 37, 36),
+    "overlay_1_opacity": 0.5,
+    "overlay_2_color": (0, 0, 0),
+    "overlay_2_opacity": 0.2,
+    "quote_font_percent": 0.06,
+    "quote_font_min_percent": 0.035,  # Auto-fit search range
+    "quote_font_max_percent": 0.085,
+    "quote_fit_padding": 0.04,  # Vertical breathing room kept free when auto-fitting
+    "attribution_font_percent": 0.0315,
+    "margin_lr_percent": 0.242,
+    "margin_top": 0.054,
+    "icon_scale": 2.55,
+    "line_spacing": 1.2,
+}
+
+# =============================================================================
+# OUTPUT PROFILES
+# =============================================================================
+
+# CONFIG overrides per output format; everything else is shared
+OUTPUT_PROFILES = {
+    "feed": {"label": "Feed (1080x1350)", "output_width": 1080, "output_height": 1350},
+    "story": {
+        "label": "Story (1080x1920)",
+        "output_width": 1080,
+        "output_height": 1920,
+        "margin_top": 0.1,  # Clear of the story header and reply bar
+    },
+    "square": {"label": "Square (1080x1080)", "output_width": 1080, "output_height": 1080},
+}
+DEFAULT_PROFILE = "feed"
+
+
+def profile_config(name=None):
+    """CONFIG with an output profile's overrides applied; None is plain CONFIG."""
+    if name is None:
+        return CONFIG
+    overrides = OUTPUT_PROFILES[name]
+    return {**CONFIG, **{key: value for key, value in overrides.items() if key != "label"}}
@@ -0,0 +1,246 @@
+"""
+Pluggable encode stage.
+Turns rendered images into file bytes: baseline or progressive JPEG, WebP
+or PNG, optionally searching for the best quality under a file size cap.
+"""
+
+import io
+import math
+import time
+
+# name: (label, extension, mime)
+ENCODERS = {
+    'jpeg': ("JPEG", '.jpg', 'image/jpeg'),
+    'jpeg-progressive': ("JPEG (progressive, optimized)", '.jpg', 'image/jpeg'),
+    'webp': ("WebP", '.webp', 'image/webp'),
+    'png': ("PNG (lossless)", '.png', 'image/png'),
+}
+DEFAULT_ENCODER = 'jpeg'
+
+# Instagram accepts JPEG and PNG uploads up to 8 MB
+INSTAGRAM_FORMATS = ('JPEG', 'PNG')
+INSTAGRAM_MAX_BYTES = 8 * 1024 * 1024
+
+
+class Encoder:
+    """Encodes images in one format at one quality."""
+
+    name = None
+    format = None
+    lossy = True
+    max_bytes = None
+
+    def __init__(self, quality=92):
+        self.quality = quality
+
+    @property
+    def label(self):
+        return ENCODERS[self.name][0]
+
+    @property
+    def extension(self):
+        return ENCODERS[self.name][1]
+
+    @property
+    def mime(self):
+        return ENCODERS[self.name][2]
+
+    def encode(self, img, quality=None):
+        buffer = io.BytesIO()
+        img.save(buffer, format=self.format, **self._options(self.quality if quality is None else quality))
+        return buffer.getvalue()
+
+    def _options(self, quality):
+        raise NotImplementedError
+
+    def settings(self):
+        """Everything that affects the output bytes, for cache fingerprints."""
+        return {"encoder": self.name, "quality": self.quality if self.lossy else None}
+
+    def over_target(self, data):
+        """Whether encoded ``data`` is over this encoder's size cap, if it has one."""
+        return self.max_bytes is not None and len(data) > self.max_bytes
+
+
+class JpegEncoder(Encoder):
+    name = 'jpeg'
+    format = 'JPEG'
+
+    def _options(self, quality):
+        return {"quality": quality}
+
+
+class ProgressiveJpegEncoder(JpegEncoder):
+    """Progressive scans with optimized Huffman tables: same pixels, fewer bytes."""
+
+    name = 'jpeg-progressive'
+
+    def _options(self, quality):
+        return {"quality": quality, "progressive": True, "optimize": True}
+
+
+class WebPEncoder(Encoder):
+    name = 'webp'
+    format = 'WEBP'
+
+    def _options(self, quality):
+        return {"quality": quality, "method": 4}
+
+
+class PngEncoder(Encoder):
+    name = 'png'
+    format = 'PNG'
+    lossy = False
+
+    def _options(self, quality):
+        return {"compress_level": 6}
+
+
+class SizeTargetEncoder(Encoder):
+    """Highest quality of a lossy encoder whose output fits ``max_bytes``.
+
+    Quality is bisected on a probe downscaled by ``probe_factor``, where a
+    trial costs a fraction of a full encode. The full image is encoded at
+    the probe's answer, the probe is recalibrated against that real size
+    and searched once more. Typically two full encodes per image; if the
+    estimate still overshoots, quality is searched at full size below it.
+
+    When even ``min_quality`` is over ``max_bytes`` that encode is returned
+    anyway; callers check over_target() to report it.
+    """
+
+    def __init__(self, encoder, max_bytes, probe_factor=2, min_quality=30, max_quality=95):
+        if not encoder.lossy:
+            raise ValueError(f"{encoder.label} has no quality setting to target a size with")
+        super().__init__(encoder.quality)
+        self.encoder = encoder
+        self.max_bytes = int(max_bytes)
+        self.probe_factor = probe_factor
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.last_quality = None
+
+    @property
+    def name(self):
+        return self.encoder.name
+
+    @property
+    def format(self):
+        return self.encoder.format
+
+    def encode(self, img, quality=None):
+        probe = img.reduce(self.probe_factor)
+        probe_sizes = {}
+
+        def probe_size(q):
+            if q not in probe_sizes:
+                probe_sizes[q] = len(self.encoder.encode(probe, q))
+            return probe_sizes[q]
+
+        def search(probe_budget):
+            lo, hi, best = self.min_quality, self.max_quality, self.min_quality
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                if probe_size(mid) <= probe_budget:
+                    best, lo = mid, mid + 1
+                else:
+                    hi = mid - 1
+            return best
+
+        quality = search(self.max_bytes / self.probe_factor ** 2)
+        data = self.encoder.encode(img, quality)
+        full_sizes = {quality: len(data)}
+
+        # Detail per pixel differs at full size; scale the budget by what the
+        # real encode showed and search again, up if there is room to spare,
+        # down if the first guess overshot
+        refined = search(self.max_bytes * probe_size(quality) / len(data))
+        if refined != quality:
+            candidate = self.encoder.encode(img, refined)
+            full_sizes[refined] = len(candidate)
+            if len(candidate) <= self.max_bytes or len(data) > self.max_bytes:
+                data, quality = candidate, refined
+
+        if len(data) > self.max_bytes and quality > self.min_quality:
+            quality, data = self._search_full(img, quality, data, full_sizes)
+
+        self.last_quality = quality
+        return data
+
+    def _search_full(self, img, quality, data, sizes):
+        """Highest quality under ``quality`` whose full-size encode fits.
+
+        Bisects between min_quality and ``quality``, placing each split
+        where a line through the nearest fit and miss (or the two lowest
+        misses, until something fits) crosses ``max_bytes``. If nothing
+        fits, min_quality's encode is returned.
+        """
+        lo, hi = self.min_quality, quality - 1
+        fit, miss = None, (quality, data)
+        while lo <= hi:
+            mid = self._split(lo, hi, fit, miss[0], sizes)
+            candidate = self.encoder.encode(img, mid)
+            sizes[mid] = len(candidate)
+            if len(candidate) <= self.max_bytes:
+                fit, lo = (mid, candidate), mid + 1
+            else:
+                miss, hi = (mid, candidate), mid - 1
+        return fit or miss
+
+    def _split(self, lo, hi, fit, miss, sizes):
+        if fit is not None:
+            anchor = fit[0]
+        else:
+            anchor = min((q for q in sizes if q > miss), default=None)
+        if anchor is None or sizes[anchor] == sizes[miss]:
+            return (lo + hi) // 2
+        slope = (sizes[miss] - sizes[anchor]) / (miss - anchor)
+        mid = math.floor(miss - (sizes[miss] - self.max_bytes) / slope)
+        return min(max(mid, lo), hi)
+
+    def settings(self):
+        return {**self.encoder.settings(), "quality": None, "max_bytes": self.max_bytes}
+
+
+_ENCODER_CLASSES = {
+    'jpeg': JpegEncoder,
+    'jpeg-progressive': ProgressiveJpegEncoder,
+    'webp': WebPEncoder,
+    'png': PngEncoder,
+}
+
+
+def make_encoder(name=DEFAULT_ENCODER, quality=92, max_bytes=None):
+    """Build the encoder for an ENCODERS name, size-targeted if ``max_bytes``."""
+    if name not in _ENCODER_CLASSES:
+        raise ValueError(f"Unknown encoder: {name}")
+    encoder = _ENCODER_CLASSES[name](quality=quality)
+    if max_bytes:
+        encoder = SizeTargetEncoder(encoder, max_bytes)
+    return encoder
+
+
+def compare_encoders(images, encoders):
+    """Encode every image with every encoder; one report row per encoder."""
+    rows = []
+    for encoder in encoders:
+        sizes = []
+        over = 0
+        start = time.perf_counter()
+        for img in images:
+            data = encoder.encode(img)
+            sizes.append(len(data))
+            over += encoder.over_target(data)
+        elapsed = time.perf_counter() - start
+
+        rows.append({
+            "encoder": encoder.label,
+            "target_kb": encoder.max_bytes // 1024 if encoder.max_bytes else None,
+            "images": len(images),
+            "mean_ms": round(elapsed * 1000 / len(images), 2),
+            "mean_kb": round(sum(sizes) / len(sizes) / 1024, 1),
+            "max_kb": round(max(sizes) / 1024, 1),
+            "over_target": over if encoder.max_bytes else None,
+            "instagram_ok": encoder.format in INSTAGRAM_FORMATS and max(sizes) <= INSTAGRAM_MAX_BYTES,
+        })
+    return rows
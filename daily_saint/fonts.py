@@ -0,0 +1,81 @@
+"""
+Font registry.
+Parses each uploaded font once per (content hash, size) and reuses the
+FreeType face for every image in the batch.
+"""
+
+import io
+import threading
+from collections import OrderedDict
+
+from PIL import ImageFont
+
+from .backgrounds import content_hash
+
+# Room for every size an auto-fit search can probe, plus the attribution
+DEFAULT_MAX_FACES = 128
+
+
+class FontRegistry:
+    """LRU of loaded FreeType faces keyed by (content hash, size)."""
+
+    def __init__(self, max_faces=DEFAULT_MAX_FACES):
+        self.max_faces = max_faces
+        self.hits = 0
+        self.misses = 0
+        self._faces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._faces)
+
+    def digest(self, font_bytes):
+        """Content hash of a font.
+
+        Not memoized by object: the app reads uploads into new bytes on
+        every rerun, and pinning each one to keep its id valid kept them
+        all alive. Callers needing several sizes hash once and pass
+        ``digest`` to get().
+        """
+        return content_hash(font_bytes)
+
+    def get(self, font_bytes, size, digest=None):
+        """Return the face for ``font_bytes`` at ``size``, loading it on a miss."""
+        if digest is None:
+            digest = self.digest(font_bytes)
+        key = (digest, int(size))
+
+        with self._lock:
+            font = self._faces.get(key)
+            if font is not None:
+                self._faces.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+
+        font = ImageFont.truetype(io.BytesIO(font_bytes), int(size))
+
+        with self._lock:
+            self._faces[key] = font
+            while len(self._faces) > self.max_faces:
+                self._faces.popitem(last=False)
+        return font
+
+    def clear(self):
+        with self._lock:
+            self._faces.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {"faces": len(self._faces), "hits": self.hits, "misses": self.misses}
+
+
+# Process-wide registry; like st.cache_resource it outlives script reruns,
+# and it also works inside pool workers and headless runs
+font_registry = FontRegistry()
+
+
+def load_font(font_bytes, size):
+    """Cached replacement for ImageFont.truetype(io.BytesIO(font_bytes), size)."""
+    return font_registry.get(font_bytes, size)
@@ -0,0 +1,138 @@
+"""
+Film grain engine.
+Soft light blending precomputed once per grain texture and intensity.
+
+The grain texture is 8-bit, so the normalized blend value takes at most
+256 distinct levels. Together with the 8-bit base that makes soft light a
+256x256 table lookup: both branches (and the sqrt) are evaluated once per
+batch and each image is blended with one gather per channel.
+
+Textures are kept at their own size and fitted to each output size when
+its blend table is built, so a story and a square post both get grain at
+the texture's true proportions.
+"""
+
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+from .backgrounds import content_hash, crop_box
+
+_fields = {}
+_images = {}
+_lock = threading.Lock()
+_MAX_FIELDS = 4
+_MAX_IMAGES = 4
+
+
+class GrainField:
+    """Precomputed soft light blend for one grain texture at one intensity."""
+
+    def __init__(self, grain_image, intensity=0.5, size=None):
+        grain = grain_image.convert('L')
+        if size is not None:
+            grain = fit_grain(grain, size)
+
+        self.size = grain.size
+        self.intensity = intensity
+
+        levels = np.arange(256, dtype=np.float32) / 255.0
+        grain_arr = np.array(grain, dtype=np.float32) / 255.0
+        mean = grain_arr.mean()
+        del grain_arr
+
+        # Blend value for each grain level, exactly as the per-pixel formula
+        blend = 0.5 + (levels - mean) * intensity
+        np.clip(blend, 0, 1, out=blend)
+
+        s = blend[:, None]
+        b = levels[None, :]
+        table = np.where(
+            s < 0.5,
+            2 * b * s + b * b * (1 - 2 * s),
+            2 * b * (1 - s) + np.sqrt(np.clip(b, 0.0001, 1)) * (2 * s - 1)
+        )
+        # Row = grain level, column = base value
+        self.table = np.clip(table * 255, 0, 255).astype(np.uint8).ravel()
+
+        # Grain level pre-shifted into the row index; g * 256 + b fits uint16
+        self.offsets = np.array(grain, dtype=np.uint16) << 8
+
+    def apply(self, base):
+        """Blend the grain into ``base``, leaving any alpha channel untouched."""
+        if base.size != self.size:
+            raise ValueError(f"Grain is {self.size}, image is {base.size}")
+
+        arr = np.array(base)
+        index = np.empty(self.offsets.shape, dtype=np.uint16)
+
+        if arr.ndim == 2:
+            np.add(self.offsets, arr, out=index)
+            arr = self.table.take(index)
+        else:
+            for c in range(min(3, arr.shape[2])):
+                np.add(self.offsets, arr[:, :, c], out=index)
+                arr[:, :, c] = self.table.take(index)
+
+        return Image.fromarray(arr)
+
+
+def fit_grain(grain_image, size):
+    """Center crop a texture to ``size``'s aspect ratio and resize it to ``size``."""
+    size = tuple(size)
+    if grain_image.size == size:
+        return grain_image
+    return grain_image.resize(size, Image.Resampling.LANCZOS, box=crop_box(grain_image.size, *size))
+
+
+def load_grain_image(fp, size=None):
+    """Open a grain texture (path or file object) as grayscale.
+
+    Kept at its own size unless ``size`` is given; GrainField fits it to
+    each output size.
+    """
+    with Image.open(fp) as grain_image:
+        grain = grain_image.convert('L')
+    return grain if size is None else fit_grain(grain, size)
+
+
+def cached_grain_image(grain_bytes, digest=None):
+    """load_grain_image for uploaded bytes, cached by content.
+
+    Returns the same image object for the same texture, so the blend
+    tables get_grain_field keeps for it survive app reruns, where every
+    rerun reads the upload into new bytes. Pass ``digest`` if the bytes'
+    content_hash is already known.
+    """
+    key = digest or content_hash(grain_bytes)
+    grain_image = _images.get(key)
+    if grain_image is None:
+        grain_image = load_grain_image(io.BytesIO(grain_bytes))
+        with _lock:
+            if len(_images) >= _MAX_IMAGES:
+                _images.clear()
+            _images[key] = grain_image
+    return grain_image
+
+
+def get_grain_field(grain_image, intensity=0.5, size=None):
+    """Return the GrainField for this grain image object, building it once.
+
+    ``size`` fits the original texture to one output size, so every
+    profile gets its own table built from the texture rather than from
+    another profile's resize.
+    """
+    key = (id(grain_image), float(intensity), tuple(size) if size else None)
+    entry = _fields.get(key)
+    # Keep a reference to the image so the id cannot be reused
+    if entry is not None and entry[0] is grain_image:
+        return entry[1]
+
+    field = GrainField(grain_image, intensity=intensity, size=size)
+    with _lock:
+        if len(_fields) >= _MAX_FIELDS:
+            _fields.clear()
+        _fields[key] = (grain_image, field)
+    return field
@@ -0,0 +1,40 @@
+"""
+Pre-rasterized icon cache.
+ICON_SVG is rendered through cairo once per scale; every image after that
+pastes the cached raster and alpha mask.
+"""
+
+import io
+import threading
+
+from PIL import Image
+
+from .config import ICON_SVG
+
+_icons = {}
+_lock = threading.Lock()
+
+
+def load_svg_as_image(svg_string, scale=3):
+    """Load SVG from string and convert to PIL Image."""
+    # Imported here: workers and cache hits never need cairo
+    import cairosvg
+
+    png_data = cairosvg.svg2png(bytestring=svg_string.encode(), scale=scale)
+    return Image.open(io.BytesIO(png_data)).convert("RGBA")
+
+
+def get_icon(scale):
+    """Return the cached (icon, alpha mask) pair for ICON_SVG at ``scale``."""
+    entry = _icons.get(scale)
+    if entry is None:
+        install_icon(scale, load_svg_as_image(ICON_SVG, scale=scale))
+        entry = _icons[scale]
+    return entry
+
+
+def install_icon(scale, icon):
+    """Seed the cache with a raster built elsewhere, e.g. in the parent process."""
+    icon.load()
+    with _lock:
+        _icons[scale] = (icon, icon.getchannel('A'))
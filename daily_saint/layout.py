@@ -0,0 +1,137 @@
+"""
+Text layout engine.
+
+Each word is measured once per font (advance plus ink extents), so wrapping
+a quote is a walk over cumulative widths instead of a textbbox call per
+word. A line's ink width is the pen position of its last word plus that
+word's right extent, minus the first word's left bearing, which matches
+draw.textbbox for the joined line without re-measuring it.
+"""
+
+import weakref
+from collections import OrderedDict, namedtuple
+
+from .fonts import font_registry
+
+Layout = namedtuple('Layout', 'lines widths')
+Fit = namedtuple('Fit', 'size font layout')
+
+# Completed layouts kept per font
+MAX_LAYOUTS = 4096
+
+
+class FontMetrics:
+    """Cached word measurements and finished layouts for one font object."""
+
+    def __init__(self, font):
+        # Weak, so the metrics do not keep their own cache key alive
+        self.font = weakref.proxy(font)
+        self.space = font.getlength(' ')
+        self._words = {}
+        self._layouts = OrderedDict()
+
+    def word(self, word):
+        """Return (advance, left bearing, right extent) for ``word``."""
+        metrics = self._words.get(word)
+        if metrics is None:
+            left, _, right, _ = self.font.getbbox(word)
+            metrics = (self.font.getlength(word), left, right)
+            self._words[word] = metrics
+        return metrics
+
+    def layout(self, text, max_width):
+        """Greedy word wrap of ``text`` to ``max_width``, memoized."""
+        key = (text, max_width)
+        layout = self._layouts.get(key)
+        if layout is not None:
+            self._layouts.move_to_end(key)
+            return layout
+
+        layout = self._wrap(text.split(), max_width)
+        self._layouts[key] = layout
+        if len(self._layouts) > MAX_LAYOUTS:
+            self._layouts.popitem(last=False)
+        return layout
+
+    def _wrap(self, words, max_width):
+        lines = []
+        widths = []
+        current = []
+        left = 0
+        pen = 0
+        line_width = 0
+
+        for word in words:
+            advance, word_left, word_right = self.word(word)
+
+            if current:
+                start = pen + self.space
+                width = start + word_right - left
+                if width <= max_width:
+                    current.append(word)
+                    pen = start + advance
+                    line_width = width
+                    continue
+                lines.append(' '.join(current))
+                widths.append(line_width)
+
+            # A word too wide for any line still gets a line of its own
+            current = [word]
+            left = word_left
+            pen = advance
+            line_width = word_right - word_left
+
+        if current:
+            lines.append(' '.join(current))
+            widths.append(line_width)
+
+        return Layout(lines, widths)
+
+
+_metrics = weakref.WeakKeyDictionary()
+
+
+def font_metrics(font):
+    """Return the FontMetrics for a font object, creating it once."""
+    metrics = _metrics.get(font)
+    if metrics is None:
+        metrics = _metrics[font] = FontMetrics(font)
+    return metrics
+
+
+def layout_text(text, font, max_width):
+    """Wrap ``text`` to ``max_width`` and return its lines and ink widths."""
+    return font_metrics(font).layout(text, max_width)
+
+
+def block_fits(layout, size, max_width, max_height, line_spacing):
+    """True if every line and the whole block fit the text area."""
+    if layout.widths and max(layout.widths) > max_width:
+        return False
+    return len(layout.lines) * int(size * line_spacing) <= max_height
+
+
+def fit_text(text, font_bytes, max_width, max_height, min_size, max_size, line_spacing):
+    """Largest font size in [min_size, max_size] whose wrapped text fits.
+
+    Binary search over integer sizes. Each probe uses a cached face and its
+    cached word metrics, so after the first few quotes of a batch a fit is a
+    handful of memoized layouts. Falls back to ``min_size`` if nothing fits.
+    """
+    best = None
+    digest = font_registry.digest(font_bytes)
+    lo, hi = int(min_size), int(max_size)
+    while lo <= hi:
+        size = (lo + hi) // 2
+        font = font_registry.get(font_bytes, size, digest)
+        layout = layout_text(text, font, max_width)
+        if block_fits(layout, size, max_width, max_height, line_spacing):
+            best = Fit(size, font, layout)
+            lo = size + 1
+        else:
+            hi = size - 1
+
+    if best is None:
+        font = font_registry.get(font_bytes, int(min_size), digest)
+        best = Fit(int(min_size), font, layout_text(text, font, max_width))
+    return best
@@ -0,0 +1,139 @@
+"""
+Memory budget for batch rendering.
+
+The batch engine checks the resident memory of the app process plus its
+render workers after every result. Above the high-water mark it backs off:
+fewer renders in flight and smaller caches. If usage is still over the
+budget with a single render in flight, it stops the worker pool and
+finishes the batch in-process, which is slower but keeps the server alive.
+"""
+
+import gc
+import multiprocessing
+import os
+from contextlib import contextmanager
+
+from .backgrounds import background_cache
+from .config import CONFIG
+from .profiling import current_rss
+
+# Fraction of the budget where backing off starts
+HIGH_WATER = 0.85
+
+# Fraction of the budget prepared-base caches may use, split across processes
+CACHE_SHARE = 0.25
+
+# Never shrink a cache below one RGBA feed base; see cache_floor for
+# batches with several formats
+MIN_CACHE_BYTES = CONFIG['output_width'] * CONFIG['output_height'] * 4
+
+# Fraction of the detected memory limit used as the default budget
+DEFAULT_BUDGET_SHARE = 0.75
+
+_CGROUP_LIMITS = (
+    '/sys/fs/cgroup/memory.max',
+    '/sys/fs/cgroup/memory/memory.limit_in_bytes',
+)
+
+
+def memory_limit():
+    """Memory available to this process in bytes: the container limit or
+    physical memory, whichever is smaller. None if neither is known."""
+    limits = []
+    for path in _CGROUP_LIMITS:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit():
+            limits.append(int(value))
+    try:
+        limits.append(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'))
+    except (AttributeError, ValueError, OSError):
+        pass
+    # cgroup v1 reports "unlimited" as a huge number, so min() handles it
+    return min(limits) if limits else None
+
+
+def default_budget():
+    """Suggested budget in bytes, or None if the limit cannot be detected."""
+    limit = memory_limit()
+    return int(limit * DEFAULT_BUDGET_SHARE) if limit else None
+
+
+def cache_floor(sizes=()):
+    """Smallest useful cache for a batch rendering bases at ``sizes``.
+
+    Jobs of one background alternate between every format in the batch,
+    so the floor holds one RGBA base of each; smaller, and each job
+    rebuilds the bases the previous one evicted.
+    """
+    return max(MIN_CACHE_BYTES, sum(width * height * 4 for width, height in sizes))
+
+
+def trim_caches(floor=MIN_CACHE_BYTES):
+    """Halve this process's prepared-base cache and collect garbage.
+
+    Never goes below ``floor`` (see cache_floor). Returns False once the
+    cache is already at its minimum.
+    """
+    previous = background_cache.max_bytes
+    target = max(floor, background_cache.current_bytes // 2)
+    background_cache.resize(min(previous, target))
+    gc.collect()
+    return background_cache.max_bytes < previous
+
+
+class MemoryBudget:
+    """RSS budget for a batch, covering the app process and its workers.
+
+    ``events`` collects a line for every step taken to stay under budget,
+    for the app or CLI to report after the batch.
+    """
+
+    def __init__(self, limit_bytes, high_water=HIGH_WATER):
+        self.limit_bytes = int(limit_bytes)
+        self.high_water = high_water
+        self.peak = 0
+        self.events = []
+
+    def usage(self):
+        """Current RSS of this process and its live children, or None."""
+        total = current_rss()
+        if total is None:
+            return None
+        for child in multiprocessing.active_children():
+            total += current_rss(child.pid) or 0
+        self.peak = max(self.peak, total)
+        return total
+
+    def over_high_water(self, usage):
+        return usage is not None and usage > self.limit_bytes * self.high_water
+
+    def over_limit(self, usage):
+        return usage is not None and usage > self.limit_bytes
+
+    def cache_bytes(self, processes, floor=MIN_CACHE_BYTES):
+        """Prepared-base cache bound for each of ``processes`` processes."""
+        return max(floor, int(self.limit_bytes * CACHE_SHARE / processes))
+
+    def worker_limit(self, workers):
+        """RSS above which a worker trims its own caches."""
+        return int(self.limit_bytes * self.high_water / (workers + 1))
+
+    @contextmanager
+    def limit_caches(self, processes, floor=MIN_CACHE_BYTES):
+        """Bound this process's base cache for the batch, restoring it after."""
+        previous = background_cache.max_bytes
+        background_cache.resize(min(previous, self.cache_bytes(processes, floor)))
+        try:
+            yield
+        finally:
+            background_cache.resize(previous)
+
+    def note(self, usage, action):
+        self.events.append(
+            f"Memory {usage / (1024 * 1024):.0f} MB of "
+            f"{self.limit_bytes / (1024 * 1024):.0f} MB budget: {action}"
+        )
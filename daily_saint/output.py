@@ -0,0 +1,215 @@
+"""
+Output sinks.
+Encoded images are written to disk as they are produced, so a batch never
+holds the whole archive in memory.
+"""
+
+import io
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+
+OUTPUT_DIR = os.path.join(tempfile.gettempdir(), 'daily_saint')
+
+# Archives older than this are removed when a new batch starts
+MAX_ARCHIVE_AGE = 6 * 60 * 60
+
+
+def new_archive_path(suffix='.zip', directory=None):
+    """Reserve a unique file name for a new archive."""
+    directory = directory or OUTPUT_DIR
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='daily_saint_', suffix=suffix, dir=directory)
+    os.close(fd)
+    return path
+
+
+def cleanup_archives(directory=None, max_age=MAX_ARCHIVE_AGE, keep=()):
+    """Delete archives older than ``max_age`` seconds, except paths in ``keep``."""
+    directory = directory or OUTPUT_DIR
+    if not os.path.isdir(directory):
+        return 0
+
+    keep = {os.path.abspath(p) for p in keep if p}
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.abspath(os.path.join(directory, name))
+        if path in keep or not name.startswith('daily_saint_'):
+            continue
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def remove_archive(path):
+    """Delete an archive if it still exists."""
+    if path and os.path.isfile(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# =============================================================================
+# SINKS
+# =============================================================================
+
+class OutputSink:
+    """Destination for encoded images, written one at a time.
+
+    Tracks payload bytes in, bytes actually stored and the time spent
+    writing, so archive modes can be compared on real batches.
+    """
+
+    mode = None
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def add(self, filename, data):
+        start = time.perf_counter()
+        stored = self._write(filename, data)
+        self.seconds += time.perf_counter() - start
+        self.count += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(data) if stored is None else stored
+
+    def _write(self, filename, data):
+        """Write one file and return the bytes it occupies (None = as given)."""
+        raise NotImplementedError
+
+    def report(self):
+        return {
+            "mode": self.mode,
+            "files": self.count,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "seconds": round(self.seconds, 4),
+        }
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ZipSink(OutputSink):
+    """ZIP archive streamed straight to a file on disk.
+
+    Stored (no compression) by default: JPEG payloads barely shrink under
+    DEFLATE, so compressing them is mostly wasted CPU.
+    """
+
+    def __init__(self, path=None, compression=zipfile.ZIP_STORED):
+        super().__init__(path or new_archive_path('.zip'))
+        self.mode = 'zip-deflate' if compression == zipfile.ZIP_DEFLATED else 'zip-store'
+        self._zf = zipfile.ZipFile(self.path, 'w', compression)
+
+    def _write(self, filename, data):
+        self._zf.writestr(filename, data)
+        return self._zf.getinfo(filename).compress_size
+
+    def close(self):
+        if self._zf is not None:
+            self._zf.close()
+            self._zf = None
+
+
+class TarSink(OutputSink):
+    """Uncompressed tar archive streamed to a file on disk."""
+
+    mode = 'tar'
+
+    def __init__(self, path=None):
+        super().__init__(path or new_archive_path('.tar'))
+        self._tf = tarfile.open(self.path, 'w')
+
+    def _write(self, filename, data):
+        info = tarfile.TarInfo(filename)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tf.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        if self._tf is not None:
+            self._tf.close()
+            self._tf = None
+
+
+class DirectorySink(OutputSink):
+    """Plain folder of image files."""
+
+    mode = 'folder'
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        super().__init__(path)
+
+    def _write(self, filename, data):
+        # Archive names are relative; never let one (absolute, or with
+        # "..") write outside the folder
+        root = os.path.realpath(self.path)
+        target = os.path.realpath(os.path.join(root, filename))
+        if os.path.commonpath([root, target]) != root or target == root:
+            raise ValueError(f"Refusing to write {filename!r} outside {self.path}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + '.part'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, target)
+
+
+# =============================================================================
+# ARCHIVE MODES
+# =============================================================================
+
+ARCHIVE_MODES = {
+    'zip-store': ("ZIP (stored)", '.zip', 'application/zip'),
+    'zip-deflate': ("ZIP (deflate)", '.zip', 'application/zip'),
+    'tar': ("TAR", '.tar', 'application/x-tar'),
+    'folder': ("Folder", '', None),
+}
+
+DEFAULT_ARCHIVE_MODE = 'zip-store'
+
+
+def open_sink(mode=DEFAULT_ARCHIVE_MODE, path=None):
+    """Create the sink for an archive mode; ``folder`` requires a path."""
+    if mode == 'zip-store':
+        return ZipSink(path, compression=zipfile.ZIP_STORED)
+    if mode == 'zip-deflate':
+        return ZipSink(path, compression=zipfile.ZIP_DEFLATED)
+    if mode == 'tar':
+        return TarSink(path)
+    if mode == 'folder':
+        if path is None:
+            raise ValueError("Folder export needs an output path")
+        return DirectorySink(path)
+    raise ValueError(f"Unknown archive mode: {mode}")
+
+
+def format_report(report):
+    """One-line summary of an archive report."""
+    mb = 1024 * 1024
+    label = ARCHIVE_MODES.get(report['mode'], (report['mode'],))[0]
+    return (
+        f"{label}: {report['files']} files • {report['bytes_out'] / mb:.1f} MB • "
+        f"saved {report['bytes_saved'] / mb:.2f} MB in {report['seconds']:.2f}s"
+    )
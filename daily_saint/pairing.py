@@ -0,0 +1,145 @@
+"""
+Background pairing.
+Assigns a background to every quote from an explicit seed, so a batch can
+be regenerated exactly, and describes the result in a pairing manifest.
+
+A quote can pin its background with a ``"background"`` field holding an
+uploaded file name (or content hash); the rest are drawn by the scheduler.
+"""
+
+import random
+from collections import deque
+
+# mode: label
+PAIRING_MODES = {
+    'balanced': "Balanced (every background used evenly, no back-to-back repeats)",
+    'random': "Random",
+}
+DEFAULT_PAIRING_MODE = 'balanced'
+
+MANIFEST_VERSION = 1
+
+
+def new_seed():
+    """A fresh seed for batches that do not ask for one."""
+    return random.SystemRandom().randrange(2 ** 32)
+
+
+class BalancedDeck:
+    """Round-robin over shuffled rounds of every background.
+
+    Each round deals every background once in a new order, so counts never
+    differ by more than one across a round. A card that would repeat the
+    previous background is skipped in favour of the next one, dealing from
+    the following round if needed.
+    """
+
+    def __init__(self, keys, rng):
+        self.keys = list(keys)
+        self.rng = rng
+        self._deck = deque()
+        self._distinct = len(set(self.keys))
+
+    def _refill(self):
+        cards = list(self.keys)
+        self.rng.shuffle(cards)
+        self._deck.extend(cards)
+
+    def _take(self, avoid):
+        for i, key in enumerate(self._deck):
+            if key != avoid:
+                del self._deck[i]
+                return key
+        return None
+
+    def draw(self, avoid=None):
+        if not self._deck:
+            self._refill()
+        key = self._take(avoid)
+        if key is None and self._distinct > 1:
+            # Only the avoided background is left in this round
+            self._refill()
+            key = self._take(avoid)
+        if key is None:
+            # Only one background: repeats are unavoidable
+            key = self._deck.popleft()
+        return key
+
+
+def resolve_pin(pin, background_keys, names=None):
+    """Background key for a pinned file name or content hash."""
+    if pin in background_keys:
+        return pin
+    if names and pin in names:
+        return names[pin]
+    raise ValueError(f"Pinned background {pin!r} is not among the uploaded backgrounds")
+
+
+def iter_pairing(quotes, background_keys, seed=None, mode=DEFAULT_PAIRING_MODE, names=None, report=None):
+    """Yield ``(quote, background key)`` for each quote as it is read.
+
+    Lazy, so ``quotes`` may be a stream; see pair_backgrounds.
+    """
+    if mode not in PAIRING_MODES:
+        raise ValueError(f"Unknown pairing mode: {mode}")
+    if not background_keys:
+        for quote_data in quotes:
+            yield quote_data, None
+        return
+
+    rng = random.Random(seed)
+    deck = BalancedDeck(background_keys, rng)
+    previous = None
+    for number, quote_data in enumerate(quotes, start=1):
+        pin = quote_data.get('background')
+        key = None
+        if pin:
+            try:
+                key = resolve_pin(pin, background_keys, names)
+            except ValueError as e:
+                if report is None:
+                    raise
+                report.unpin(number, str(e))
+        if key is None and mode == 'balanced':
+            key = deck.draw(avoid=previous)
+        elif key is None:
+            key = rng.choice(background_keys)
+        yield quote_data, key
+        previous = key
+
+
+def pair_backgrounds(quotes, background_keys, seed=None, mode=DEFAULT_PAIRING_MODE, names=None, report=None):
+    """Return one background key per quote (all None without backgrounds).
+
+    ``names`` maps file names to background keys so quotes can pin by name.
+    A pin matching no background raises ValueError, or with a QuoteReport
+    is noted there and the quote is paired as if unpinned.
+    The same quotes, backgrounds, seed and mode always give the same pairing.
+    """
+    return [key for _, key in iter_pairing(quotes, background_keys, seed, mode, names, report)]
+
+
+def pairing_manifest(jobs, seed, mode, names=None):
+    """JSON-ready record of a batch's pairing, grouped by background too."""
+    labels = {key: name for name, key in (names or {}).items()}
+    groups = {}
+    for job in jobs:
+        if job.background_key is not None:
+            groups.setdefault(job.background_key, []).append(job.filename)
+
+    return {
+        "version": MANIFEST_VERSION,
+        "seed": seed,
+        "mode": mode,
+        "backgrounds": {key: labels.get(key) for key in groups},
+        "pairings": [
+            {
+                "index": job.index,
+                "filename": job.filename,
+                "saint": job.saint,
+                "background": job.background_key,
+            }
+            for job in jobs
+        ],
+        "groups": groups,
+    }
@@ -0,0 +1,171 @@
+"""
+Previews.
+Each rendered image gets a small JPEG thumbnail, made from the image
+already in memory at encode time, and kept on disk per batch. The app's
+gallery pages through them, so neither session state nor the page ever
+holds full-size images.
+
+The live preview renders a single quote with a batch's settings, reusing
+the process-wide caches (fonts, icon, prepared bases, grain tables) so an
+update takes tens of milliseconds.
+"""
+
+import io
+import os
+import shutil
+import time
+
+from PIL import Image
+
+from .config import profile_config
+from .output import MAX_ARCHIVE_AGE, OUTPUT_DIR
+from .render import generate_image
+
+PREVIEW_DIR = os.path.join(OUTPUT_DIR, 'previews')
+
+# 1080x1350 -> 270x338
+THUMBNAIL_FACTOR = 4
+THUMBNAIL_QUALITY = 80
+
+INDEX_NAME = 'index.tsv'
+
+# Live previews are shown at half size: 540x675 for a feed post
+LIVE_PREVIEW_FACTOR = 2
+LIVE_PREVIEW_QUALITY = 85
+
+
+def make_thumbnail(img):
+    """Thumbnail JPEG bytes for a rendered image."""
+    thumb = img.reduce(THUMBNAIL_FACTOR)
+    if thumb.mode != 'RGB':
+        thumb = thumb.convert('RGB')
+    buffer = io.BytesIO()
+    thumb.save(buffer, format='JPEG', quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+def thumbnail_from_bytes(data):
+    """Thumbnail for an already encoded image, e.g. a render cache hit.
+
+    JPEGs are decoded straight to a quarter of their size (Image.draft).
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        size = (img.width // THUMBNAIL_FACTOR, img.height // THUMBNAIL_FACTOR)
+        img.draft('RGB', size)
+        img = img.convert('RGB')
+        if img.size != size:
+            img = img.resize(size, Image.BILINEAR)
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+class PreviewStore:
+    """Thumbnails of one batch on disk, browsable in job order.
+
+    ``index.tsv`` lists ``index<TAB>filename`` for every stored thumbnail,
+    appended as results arrive in whatever order they finish.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @classmethod
+    def for_batch(cls, batch_id, root=PREVIEW_DIR):
+        return cls(os.path.join(root, batch_id))
+
+    def _path(self, index):
+        return os.path.join(self.directory, f"{index:06d}.jpg")
+
+    def add(self, index, filename, thumbnail):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(index), 'wb') as f:
+            f.write(thumbnail)
+        with open(os.path.join(self.directory, INDEX_NAME), 'a', encoding='utf-8') as f:
+            f.write(f"{index}\t{filename}\n")
+
+    def entries(self):
+        """``(index, filename)`` of every stored thumbnail, in job order."""
+        entries = {}
+        try:
+            with open(os.path.join(self.directory, INDEX_NAME), encoding='utf-8') as f:
+                for line in f:
+                    index, sep, filename = line.rstrip('\n').partition('\t')
+                    if sep and index.isdigit():
+                        entries[int(index)] = filename
+        except OSError:
+            pass
+        return sorted(entries.items())
+
+    def __len__(self):
+        return len(self.entries())
+
+    def page(self, number, per_page):
+        """``(filename, thumbnail bytes)`` for page ``number`` (from 0)."""
+        start = number * per_page
+        thumbnails = []
+        for index, filename in self.entries()[start:start + per_page]:
+            try:
+                with open(self._path(index), 'rb') as f:
+                    thumbnails.append((filename, f.read()))
+            except OSError:
+                continue
+        return thumbnails
+
+    def remove(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def cleanup_previews(directory=PREVIEW_DIR, max_age=MAX_ARCHIVE_AGE, keep=()):
+    """Delete preview stores untouched for ``max_age`` seconds, except batch ids in ``keep``."""
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name in keep or not os.path.isdir(path):
+            continue
+        index = os.path.join(path, INDEX_NAME)
+        try:
+            touched = os.path.getmtime(index if os.path.exists(index) else path)
+        except OSError:
+            continue
+        if touched < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+# =============================================================================
+# LIVE PREVIEW
+# =============================================================================
+
+def live_preview(renderer, quote, saint, background_key=None, profile=None):
+    """Render one quote with ``renderer``'s settings for display.
+
+    Returns half-size JPEG bytes and the time taken in milliseconds. Only
+    the first call for a font, background or grain texture pays for
+    parsing, preparing or building its tables.
+    """
+    start = time.perf_counter()
+    img = generate_image(
+        quote=quote,
+        saint_name=saint,
+        background_bytes=renderer.backgrounds.get(background_key),
+        solid_color=renderer.solid_color,
+        grayscale=renderer.grayscale,
+        bold_font_bytes=renderer.bold_font_bytes,
+        light_font_bytes=renderer.light_font_bytes,
+        grain_image=renderer.grain_image,
+        grain_intensity=renderer.grain_intensity,
+        background_key=background_key,
+        auto_fit=renderer.auto_fit,
+        config=profile_config(profile)
+    )
+    img = img.reduce(LIVE_PREVIEW_FACTOR)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=LIVE_PREVIEW_QUALITY)
+    return buffer.getvalue(), (time.perf_counter() - start) * 1000
@@ -0,0 +1,172 @@
+"""
+Opt-in per-stage instrumentation.
+
+Render code marks its stages with ``stage(name)``; that is a no-op unless a
+StageProfiler is active in the current context. Stages never nest, so their
+times add up to the render time. Records travel back from pool workers on
+each RenderResult and are aggregated by a BatchProfile.
+"""
+
+import contextvars
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar('daily_saint_profiler', default=None)
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = None
+
+
+def current_rss(pid='self'):
+    """Resident set size of a process in bytes, or None where /proc is unavailable."""
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@contextmanager
+def stage(name):
+    """Time a block under ``name`` if a profiler is active."""
+    profiler = _current.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name):
+        yield
+
+
+# =============================================================================
+# PROFILERS
+# =============================================================================
+
+class StageProfiler:
+    """Collects (stage, seconds, traced peak bytes, RSS delta bytes) records."""
+
+    def __init__(self):
+        self.records = []
+
+    @contextmanager
+    def stage(self, name):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            traced_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        rss_start = current_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            traced_peak = tracemalloc.get_traced_memory()[1] - traced_start if tracing else None
+            rss_end = current_rss()
+            rss_delta = rss_end - rss_start if rss_start is not None and rss_end is not None else None
+            self.records.append((name, elapsed, traced_peak, rss_delta))
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+class BatchProfile:
+    """Aggregates stage records for a whole batch.
+
+    Starts tracemalloc when ``trace_memory`` is set (and stops it again in
+    ``finish`` if it was not already running).
+    """
+
+    def __init__(self, trace_memory=True):
+        self.images = []
+        self.batch_stages = StageProfiler()
+        self._started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.rss_start = current_rss()
+        self.rss_end = None
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def add(self, index, filename, records):
+        """Record the stages of one rendered image."""
+        self.images.append({"index": index, "filename": filename, "stages": list(records or [])})
+
+    def stage(self, name):
+        """Time a batch-side stage such as archive writes."""
+        return self.batch_stages.stage(name)
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        self.rss_end = current_rss()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _all_records(self):
+        for image in self.images:
+            yield from image["stages"]
+        yield from self.batch_stages.records
+
+    def summary(self):
+        """One row per stage, in pipeline order, with totals and memory."""
+        stats = {}
+        for name, seconds, traced_peak, rss_delta in self._all_records():
+            row = stats.setdefault(name, {
+                "stage": name, "calls": 0, "total_s": 0.0, "max_ms": 0.0,
+                "traced_peak_kb": 0, "rss_delta_mb": 0.0,
+            })
+            row["calls"] += 1
+            row["total_s"] += seconds
+            row["max_ms"] = max(row["max_ms"], seconds * 1000)
+            if traced_peak is not None:
+                row["traced_peak_kb"] = max(row["traced_peak_kb"], traced_peak // 1024)
+            if rss_delta is not None:
+                row["rss_delta_mb"] += rss_delta / (1024 * 1024)
+
+        total = sum(row["total_s"] for row in stats.values()) or 1.0
+        rows = []
+        for row in stats.values():
+            row["mean_ms"] = round(row["total_s"] * 1000 / row["calls"], 3)
+            row["share_pct"] = round(100 * row["total_s"] / total, 1)
+            row["total_s"] = round(row["total_s"], 4)
+            row["max_ms"] = round(row["max_ms"], 3)
+            row["rss_delta_mb"] = round(row["rss_delta_mb"], 2)
+            rows.append(row)
+        return rows
+
+    def trace(self):
+        """JSON-serializable trace: summary plus per-image stage timings."""
+        mb = 1024 * 1024
+        return {
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "images": len(self.images),
+            "rss_start_mb": round(self.rss_start / mb, 1) if self.rss_start else None,
+            "rss_end_mb": round(self.rss_end / mb, 1) if self.rss_end else None,
+            "summary": self.summary(),
+            "per_image": [
+                {
+                    "index": image["index"],
+                    "filename": image["filename"],
+                    "stages_ms": _stage_totals_ms(image["stages"]),
+                }
+                for image in self.images
+            ],
+        }
+
+
+def _stage_totals_ms(records):
+    totals = {}
+    for name, seconds, _, _ in records:
+        totals[name] = totals.get(name, 0.0) + seconds * 1000
+    return {name: round(ms, 3) for name, ms in totals.items()}
@@ -0,0 +1,268 @@
+"""
+Quote ingestion.
+Reads quotes from JSON (``{"quotes": [...]}`` or a bare array), NDJSON or
+CSV one record at a time, so a batch can start rendering before a large
+file has been read and memory does not grow with the file. Every record is
+validated; bad ones are skipped and noted in a QuoteReport instead of
+stopping the batch.
+"""
+
+import csv
+import io
+import json
+import os
+
+# name: (label, file extensions)
+QUOTE_FORMATS = {
+    'json': ('JSON ({"quotes": [...]} or an array)', ('.json',)),
+    'ndjson': ("NDJSON (one quote object per line)", ('.ndjson', '.jsonl')),
+    'csv': ("CSV (text, saint and optional background columns)", ('.csv',)),
+}
+
+QUOTE_FIELDS = ('text', 'saint', 'background')
+DEFAULT_SAINT = 'Unknown Saint'
+
+# Longer quotes cannot fit the text area at any font size
+MAX_QUOTE_CHARS = 1000
+
+# Bad rows kept with their reasons; the rest are only counted
+MAX_REPORTED_ROWS = 50
+
+CHUNK_SIZE = 64 * 1024
+
+
+def quote_extensions():
+    return [ext.lstrip('.') for _, extensions in QUOTE_FORMATS.values() for ext in extensions]
+
+
+def quote_format(filename):
+    """Format name for a quotes file, from its extension."""
+    ext = os.path.splitext(filename)[1].lower()
+    for name, (_, extensions) in QUOTE_FORMATS.items():
+        if ext in extensions:
+            return name
+    raise ValueError(f"Unsupported quotes file {filename!r}; use {', '.join(quote_extensions())}")
+
+
+class QuoteReport:
+    """Counts of accepted and skipped quote records, with reasons.
+
+    ``fatal`` is set when the file cannot be read past some point (broken
+    JSON syntax); quotes before that point are still used. ``problems``
+    holds ``(where, reason)`` pairs, where is e.g. ``"row 12"``.
+    """
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.unpinned = 0
+        self.problems = []
+        self.fatal = None
+
+    def _note(self, where, reason):
+        if len(self.problems) < MAX_REPORTED_ROWS:
+            self.problems.append((where, reason))
+
+    def reject(self, row, reason):
+        self.rejected += 1
+        self._note(f"row {row}", reason)
+
+    def unpin(self, number, reason):
+        """Note the ``number``-th quote's pin to a missing background; it is paired like the rest."""
+        self.unpinned += 1
+        self._note(f"quote {number}", reason)
+
+    @property
+    def unlisted(self):
+        """Problems counted but not kept in ``problems``."""
+        return self.rejected + self.unpinned - len(self.problems)
+
+    @property
+    def ok(self):
+        return self.rejected == 0 and self.unpinned == 0 and self.fatal is None
+
+    def summary(self):
+        parts = [f"{self.accepted} quotes read"]
+        if self.rejected:
+            parts.append(f"{self.rejected} bad rows skipped")
+        if self.unpinned:
+            parts.append(f"{self.unpinned} pins to missing backgrounds ignored")
+        if self.fatal:
+            parts.append(f"stopped early: {self.fatal}")
+        return " • ".join(parts)
+
+
+def validate_quote(record):
+    """Normalized quote dict for one record, or ValueError saying what is wrong."""
+    if not isinstance(record, dict):
+        raise ValueError(f"expected an object with \"text\" and \"saint\", got {type(record).__name__}")
+    for field in QUOTE_FIELDS:
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"\"{field}\" must be text, got {type(value).__name__}")
+
+    text = (record.get('text') or '').strip()
+    if not text:
+        raise ValueError("missing \"text\"")
+    if len(text) > MAX_QUOTE_CHARS:
+        raise ValueError(f"\"text\" is {len(text)} characters; the limit is {MAX_QUOTE_CHARS}")
+
+    quote = {"text": text, "saint": (record.get('saint') or '').strip() or DEFAULT_SAINT}
+    background = (record.get('background') or '').strip()
+    if background:
+        quote["background"] = background
+    return quote
+
+
+def _iter_ndjson(stream, report):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            report.reject(line_number, f"invalid JSON: {e.msg}")
+
+
+def _iter_csv(stream, report):
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        return
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    if 'text' not in reader.fieldnames:
+        report.fatal = "CSV has no \"text\" column"
+        return
+    for record in reader:
+        if None in record:
+            report.reject(reader.line_num, "more cells than columns")
+            continue
+        # Drop columns we do not use so validation only sees known fields
+        yield reader.line_num, {field: record[field] for field in QUOTE_FIELDS if field in record}
+
+
+class _JsonScanner:
+    """Pulls consecutive JSON values out of a text stream a chunk at a time."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _read(self):
+        chunk = self.stream.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has been consumed so the buffer stays about a chunk long
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of the stream."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._read():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            found = self.peek() or 'end of file'
+            raise ValueError(f"expected {char!r}, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value, reading more until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise ValueError(f"invalid JSON: {e.msg}") from None
+                self._read()
+                continue
+            # A number at the buffer's end may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._read():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_json(stream, report):
+    scanner = _JsonScanner(stream)
+    try:
+        if scanner.peek() == '{':
+            # Step over other top-level keys until the "quotes" array
+            scanner.expect('{')
+            while True:
+                if scanner.peek() == '}':
+                    raise ValueError("no \"quotes\" array")
+                key = scanner.value()
+                scanner.expect(':')
+                if key == 'quotes':
+                    break
+                scanner.value()
+                if scanner.peek() == ',':
+                    scanner.expect(',')
+
+        scanner.expect('[')
+        if scanner.peek() == ']':
+            return
+        item = 0
+        while True:
+            item += 1
+            yield item, scanner.value()
+            if scanner.peek() == ']':
+                return
+            scanner.expect(',')
+    except ValueError as e:
+        report.fatal = str(e)
+
+
+_READERS = {
+    'json': _iter_json,
+    'ndjson': _iter_ndjson,
+    'csv': _iter_csv,
+}
+
+
+def iter_quotes(stream, fmt='json', report=None):
+    """Yield validated quote dicts from a file object, one at a time.
+
+    ``stream`` may be binary (an upload) or text. Bad records are skipped
+    and noted in ``report``; rows are numbered by line for NDJSON and CSV
+    and by position in the array for JSON.
+    """
+    if fmt not in _READERS:
+        raise ValueError(f"Unknown quotes format: {fmt}")
+    report = report if report is not None else QuoteReport()
+    text = stream
+    if not isinstance(stream, io.TextIOBase):
+        # utf-8-sig drops the BOM spreadsheet exports start with
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        for row, record in _READERS[fmt](text, report):
+            try:
+                quote = validate_quote(record)
+            except ValueError as e:
+                report.reject(row, str(e))
+                continue
+            report.accepted += 1
+            yield quote
+    except UnicodeDecodeError as e:
+        report.fatal = f"not UTF-8 text ({e.reason})"
+    finally:
+        if text is not stream:
+            # Leave the caller's file open
+            text.detach()
+
+
+def stream_quotes(path, report=None, fmt=None):
+    """iter_quotes over a file on disk, open only while being read."""
+    fmt = fmt or quote_format(path)
+    with open(path, 'rb') as f:
+        yield from iter_quotes(f, fmt, report)
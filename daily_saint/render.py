@@ -0,0 +1,186 @@
+"""
+Quote image rendering.
+"""
+
+import io
+
+from PIL import Image, ImageDraw
+
+from .backgrounds import background_cache
+from .config import CONFIG
+from .fonts import load_font
+from .grain import GrainField, get_grain_field
+from .icons import get_icon
+from .layout import fit_text, layout_text
+from .profiling import stage
+
+# =============================================================================
+# HELPER FUNCTIONS
+# =============================================================================
+
+def hex_to_rgb(hex_color):
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+def soft_light_blend(base, blend, intensity=0.5):
+    """Apply soft light blending mode for film grain effect. Memory optimized."""
+    return GrainField(blend, intensity=intensity).apply(base)
+
+
+def wrap_text(text, font, max_width, draw=None):
+    """Wrap text to max_width; ``draw`` is accepted for compatibility."""
+    return layout_text(text, font, max_width).lines
+
+
+def sanitize_filename(name):
+    """Convert saint name to safe filename.
+
+    Path separators become underscores and leading ones are dropped, so a
+    name can never point outside the folder the file is written to.
+    """
+    name = name.replace(' ', '_').replace('/', '_').replace('\\', '_')
+    return name.replace('.', '').replace(',', '').replace("'", '').lstrip('_')
+
+
+# =============================================================================
+# RENDERING
+# =============================================================================
+
+def generate_image(
+    quote,
+    saint_name,
+    background_bytes=None,
+    solid_color=None,
+    grayscale=True,
+    bold_font_bytes=None,
+    light_font_bytes=None,
+    grain_image=None,
+    grain_intensity=0.5,
+    background_key=None,
+    cache=None,
+    auto_fit=False,
+    config=None
+):
+    """Generate a saint quote image. Memory optimized.
+
+    Prepared backgrounds come from ``cache`` (the shared
+    ``background_cache`` by default); pass the upload's
+    ``background_key`` (see ``content_hash``) to skip rehashing its bytes.
+    With ``auto_fit`` the quote uses the largest size in the configured
+    range that fits between the icon and the attribution. ``config``
+    replaces CONFIG, e.g. with ``profile_config('story')`` for another
+    output format.
+    """
+    if config is None:
+        config = CONFIG
+
+    width = config['output_width']
+    height = config['output_height']
+
+    quote_font_size = int(width * config['quote_font_percent'])
+    attribution_font_size = int(width * config['attribution_font_percent'])
+    margin_lr = int(width * config['margin_lr_percent'])
+    margin_top = int(height * config['margin_top'])
+    icon_scale = config['icon_scale']
+
+    # Create background
+    if solid_color:
+        with stage('solid fill'):
+            bg = Image.new('RGB', (width, height), hex_to_rgb(solid_color))
+    else:
+        if cache is None:
+            cache = background_cache
+        bg = cache.get(
+            background_bytes,
+            (width, height),
+            grayscale=grayscale,
+            digest=background_key
+        )
+
+    # Apply grain texture (blend table built once per grain and intensity)
+    if grain_image is not None:
+        with stage('grain'):
+            grain = get_grain_field(grain_image, grain_intensity, size=(width, height))
+            bg = grain.apply(bg)
+
+    draw = ImageDraw.Draw(bg)
+
+    # Load fonts (parsed once per font and size, then reused)
+    with stage('fonts'):
+        if not auto_fit:
+            quote_font = load_font(bold_font_bytes, quote_font_size)
+        attribution_font = load_font(light_font_bytes, attribution_font_size)
+
+    # Place icon (rasterized once per scale)
+    with stage('icon'):
+        icon, icon_mask = get_icon(icon_scale)
+        icon_x = (width - icon.width) // 2
+        icon_y = margin_top
+        bg.paste(icon, (icon_x, icon_y), icon_mask)
+
+    with stage('layout'):
+        # Calculate attribution position
+        attr_bbox = draw.textbbox((0, 0), saint_name, font=attribution_font)
+        attr_height = attr_bbox[3] - attr_bbox[1]
+        attr_y = height - margin_top - attr_height
+
+        # Calculate text area
+        max_text_width = width - (margin_lr * 2)
+        icon_bottom = margin_top + int(28 * icon_scale)  # Approximate icon height
+        available_space = attr_y - icon_bottom
+
+        # Wrap quote (memoized per text and font; widths come with it)
+        if auto_fit:
+            quote_font_size, quote_font, layout = fit_text(
+                quote,
+                bold_font_bytes,
+                max_text_width,
+                available_space - int(height * config['quote_fit_padding']),
+                int(width * config['quote_font_min_percent']),
+                int(width * config['quote_font_max_percent']),
+                config['line_spacing']
+            )
+        else:
+            layout = layout_text(quote, quote_font, max_text_width)
+        lines = layout.lines
+
+        line_height = int(quote_font_size * config['line_spacing'])
+        total_text_height = len(lines) * line_height
+
+        # Center quote between icon and attribution
+        quote_y = icon_bottom + (available_space - total_text_height) // 2
+
+        positions = []
+        for i, text_width in enumerate(layout.widths):
+            x = int(width - text_width) // 2
+            y = quote_y + (i * line_height)
+            positions.append((x, y))
+
+        attr_width = attr_bbox[2] - attr_bbox[0]
+        attr_x = (width - attr_width) // 2
+
+    with stage('text draw'):
+        text_color = hex_to_rgb(config['text_color'])
+        for line, position in zip(lines, positions):
+            draw.text(position, line, font=quote_font, fill=text_color)
+
+        # Draw attribution
+        draw.text((attr_x, attr_y), saint_name, font=attribution_font, fill=text_color)
+
+    with stage('convert'):
+        return bg.convert('RGB')
+
+
+def encode_jpeg(img, quality=92):
+    """Encode an image as JPEG bytes."""
+    img_buffer = io.BytesIO()
+    img.save(img_buffer, format='JPEG', quality=quality)  # Slightly lower quality for memory
+    data = img_buffer.getvalue()
+    img_buffer.close()
+    return data
+
+
+def add_image_to_zip(zf, filename, img):
+    """Add a single image to zip file."""
+    zf.writestr(filename, encode_jpeg(img))
@@ -0,0 +1,117 @@
+"""
+Content-addressed render cache.
+Encoded images are stored on disk under a hash of everything that affects
+their pixels, so regenerating a batch only renders new or changed quotes.
+"""
+
+import hashlib
+import json
+import os
+
+from .config import CONFIG, OUTPUT_PROFILES
+from .output import OUTPUT_DIR
+
+RENDER_CACHE_DIR = os.path.join(OUTPUT_DIR, 'renders')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bump when rendering changes in a way the inputs do not capture
+CACHE_VERSION = 2
+
+
+def render_fingerprint(renderer):
+    """Digest of the batch-wide settings that affect every image."""
+    from .fonts import font_registry
+
+    grain_digest = None
+    if renderer.grain_image is not None:
+        grain = renderer.grain_image
+        grain_digest = hashlib.blake2b(
+            grain.tobytes() + repr((grain.mode, grain.size)).encode(),
+            digest_size=16
+        ).hexdigest()
+
+    settings = {
+        "version": CACHE_VERSION,
+        "config": CONFIG,
+        "bold_font": font_registry.digest(renderer.bold_font_bytes),
+        "light_font": font_registry.digest(renderer.light_font_bytes),
+        "solid_color": renderer.solid_color,
+        "grayscale": renderer.grayscale,
+        "grain": grain_digest,
+        "grain_intensity": renderer.grain_intensity if grain_digest else None,
+        "encoder": renderer.encoder.settings(),
+        "auto_fit": renderer.auto_fit,
+        "profiles": {name: OUTPUT_PROFILES[name] for name in renderer.profiles},
+    }
+    encoded = json.dumps(settings, sort_keys=True, default=list).encode()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def render_key(fingerprint, job):
+    """Cache key for one job: batch settings plus quote, saint, background and profile."""
+    parts = (fingerprint, job.quote, job.saint, job.background_key or '', job.profile or '')
+    return hashlib.blake2b('\x1f'.join(parts).encode(), digest_size=20).hexdigest()
+
+
+class RenderCache:
+    """Encoded images on disk, keyed by render_key, pruned oldest-first."""
+
+    def __init__(self, directory=RENDER_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.jpg')
+
+    def get(self, key):
+        """Return cached bytes or None; a hit refreshes the entry's age."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.part"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def prune(self):
+        """Delete least recently used entries until under ``max_bytes``."""
+        entries = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        removed = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
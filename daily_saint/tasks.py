@@ -0,0 +1,218 @@
+"""
+Background batch tasks.
+A BatchTask renders a checkpointed batch on its own thread, so the app's
+script can rerun freely while it works; the UI polls the task for progress
+and the latest thumbnails and can cancel it. Tasks live in a process-wide
+registry, so they outlive reruns and even the session that started them.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+from .batch import render_batch
+from .output import open_sink, remove_archive
+from .previews import PreviewStore, thumbnail_from_bytes
+
+# Latest thumbnails kept for live previews; the rest are in the preview store
+PREVIEW_COUNT = 6
+
+# Finished tasks are forgotten after this long
+MAX_FINISHED_AGE = 60 * 60
+
+
+class BatchTask:
+    """One checkpointed batch rendering on a background thread.
+
+    Attributes other than those read through ``snapshot`` are only written
+    by the task's own thread. When the task ends, for whatever reason, the
+    archive is assembled from everything checkpointed so far.
+    """
+
+    def __init__(
+        self,
+        checkpoint,
+        renderer,
+        archive_mode,
+        workers=1,
+        cache=None,
+        budget=None,
+        profile=None
+    ):
+        self.id = checkpoint.id
+        self.checkpoint = checkpoint
+        self.renderer = renderer
+        self.archive_mode = archive_mode
+        self.workers = workers
+        self.cache = cache
+        self.budget = budget
+        self.profile = profile
+        self.preview_store = PreviewStore.for_batch(self.id)
+
+        self.state = 'pending'
+        self.total = len(checkpoint.jobs)
+        self.resumed = len(checkpoint.completed())
+        self.done = self.resumed
+        self.reused = 0
+        # Images over the encoder's size cap even at its lowest quality
+        self.oversized = 0
+        self.errors = []
+        self.failure = None
+        self.archive = None
+        self.previews = deque(maxlen=PREVIEW_COUNT)
+        self.started = None
+        self.finished = None
+
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"daily_saint-{self.id}", daemon=True)
+
+    @property
+    def running(self):
+        return self.state in ('pending', 'running')
+
+    def start(self):
+        self.started = time.time()
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stop after the renders already in flight; the archive keeps what is done."""
+        self._cancel.set()
+
+    @property
+    def cancelling(self):
+        return self._cancel.is_set() and self.running
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return not self.running
+
+    def snapshot(self):
+        """Consistent copy of the progress fields for the UI."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "state": self.state,
+                "done": self.done,
+                "total": self.total,
+                "resumed": self.resumed,
+                "reused": self.reused,
+                "oversized": self.oversized,
+                "errors": list(self.errors),
+                "previews": list(self.previews),
+                "cancelling": self.cancelling,
+            }
+
+    def _stage(self, name):
+        return self.profile.stage(name) if self.profile is not None else nullcontext()
+
+    def _run(self):
+        self.state = 'running'
+        results = render_batch(
+            self.renderer,
+            self.checkpoint.pending(),
+            workers=self.workers,
+            cache=self.cache,
+            budget=self.budget
+        )
+        try:
+            for result in results:
+                thumbnail = None
+                if result.error is None:
+                    with self._stage('checkpoint'):
+                        self.checkpoint.record(result)
+                    thumbnail = result.thumbnail
+                    if thumbnail is None:
+                        # Render cache hits come back without one
+                        with self._stage('thumbnail'):
+                            thumbnail = thumbnail_from_bytes(result.data)
+                    self.preview_store.add(result.index, result.filename, thumbnail)
+                    if self.profile is not None and result.profile:
+                        self.profile.add(result.index, result.filename, result.profile)
+                with self._lock:
+                    self.done += 1
+                    if result.error is not None:
+                        self.errors.append((result.index, result.error))
+                    else:
+                        self.reused += result.cached
+                        self.oversized += self.renderer.encoder.over_target(result.data)
+                        self.previews.append((result.filename, thumbnail))
+                if self._cancel.is_set():
+                    break
+        except Exception as e:
+            self.failure = str(e)
+        finally:
+            # Shuts the worker pool down and drops queued renders
+            results.close()
+            self._finish()
+
+    def _finish(self):
+        try:
+            sink = open_sink(self.archive_mode)
+            with sink, self._stage('archive'):
+                self.checkpoint.assemble(sink)
+            if sink.count > 0:
+                self.archive = {"path": sink.path, "mode": self.archive_mode, "report": sink.report()}
+            else:
+                remove_archive(sink.path)
+            if self.checkpoint.is_complete():
+                self.checkpoint.remove()
+            if self.cache is not None:
+                self.cache.prune()
+        except Exception as e:
+            self.failure = self.failure or str(e)
+        finally:
+            if self.profile is not None:
+                self.profile.finish()
+            self.finished = time.time()
+            with self._lock:
+                if self.failure:
+                    self.state = 'failed'
+                elif self._cancel.is_set():
+                    self.state = 'cancelled'
+                else:
+                    self.state = 'done'
+
+
+class TaskRegistry:
+    """Process-wide index of batch tasks by checkpoint id."""
+
+    def __init__(self, max_finished_age=MAX_FINISHED_AGE):
+        self.max_finished_age = max_finished_age
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def submit(self, checkpoint, renderer, archive_mode, **options):
+        """Start a task for ``checkpoint``, or return the one already running it."""
+        with self._lock:
+            self._forget_finished()
+            task = self._tasks.get(checkpoint.id)
+            if task is not None and task.running:
+                return task
+            task = BatchTask(checkpoint, renderer, archive_mode, **options)
+            self._tasks[task.id] = task
+        return task.start()
+
+    def get(self, task_id):
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def running(self):
+        with self._lock:
+            return [task for task in self._tasks.values() if task.running]
+
+    def discard(self, task_id):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def _forget_finished(self):
+        cutoff = time.time() - self.max_finished_age
+        for task_id, task in list(self._tasks.items()):
+            if not task.running and task.finished is not None and task.finished < cutoff:
+                del self._tasks[task_id]
+
+
+# Process-wide registry; survives Streamlit reruns because modules are imported once
+task_registry = TaskRegistry()
@@ -5,16 +5,56 @@ Memory-optimized for large batches.
 """
 
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont, ImageOps
-import cairosvg
-import io
 import json
-import random
-import zipfile
-import numpy as np
+import os
 from datetime import datetime
 import gc
 
+from daily_saint import (
+    ARCHIVE_MODES,
+    DEFAULT_ENCODER,
+    DEFAULT_PAIRING_MODE,
+    ENCODERS,
+    DEFAULT_PROFILE,
+    OUTPUT_PROFILES,
+    PAIRING_MODES,
+    QUOTE_FORMATS,
+    BatchCheckpoint,
+    BatchProfile,
+    BatchRenderer,
+    MemoryBudget,
+    PreviewStore,
+    QuoteReport,
+    RenderCache,
+    build_jobs,
+    cached_grain_image,
+    cleanup_archives,
+    cleanup_checkpoints,
+    cleanup_previews,
+    content_hash,
+    default_budget,
+    default_workers,
+    format_report,
+    group_by_background,
+    iter_quotes,
+    list_checkpoints,
+    live_preview,
+    make_encoder,
+    new_seed,
+    pairing_manifest,
+    quote_extensions,
+    quote_format,
+    remove_archive,
+    render_fingerprint,
+    task_registry,
+)
+
+# Thumbnails per gallery page
+GALLERY_PAGE_SIZE = 12
+
+# Live preview renders remembered by settings, so switching back is instant
+LIVE_PREVIEW_MEMO = 8
+
 # =============================================================================
 # PAGE CONFIG
 # =============================================================================
@@ -25,232 +65,32 @@ st.set_page_config(
     layout="centered"
 )
 
-# =============================================================================
-# EMBEDDED ASSETS
-# =============================================================================
-
-ICON_SVG = '''<svg width="21" height="28" viewBox="0 0 21 28" fill="none" xmlns="http://www.w3.org/2000/svg">
-<path d="M1.23137 11.698V12.0059C1.23137 12.6859 1.78272 13.2373 2.46274 13.2373C3.14277 13.2373 3.69412 12.6859 3.69412 12.0059V11.698H9.23529V24.0118H8.92745C8.24742 24.0118 7.69608 24.5631 7.69608 25.2431C7.69608 25.9232 8.24742 26.4745 8.92745 26.4745H9.23529C9.23529 27.1545 9.78664 27.7059 10.4667 27.7059C11.1467 27.7059 11.698 27.1545 11.698 26.4745H12.0059C12.6859 26.4745 13.2373 25.9232 13.2373 25.2431C13.2373 24.5631 12.6859 24.0118 12.0059 24.0118H11.698V11.698H17.2392V12.0059C17.2392 12.6859 17.7906 13.2373 18.4706 13.2373C19.1506 13.2373 19.702 12.6859 19.702 12.0059V11.698C20.382 11.698 20.9333 11.1467 20.9333 10.4667C20.9333 9.78664 20.382 9.23529 19.702 9.23529V8.92745C19.702 8.24743 19.1506 7.69608 18.4706 7.69608C17.7906 7.69608 17.2392 8.24743 17.2392 8.92745V9.23529H11.698V3.69412H12.0059C12.6859 3.69412 13.2373 3.14277 13.2373 2.46275C13.2373 1.78272 12.6859 1.23137 12.0059 1.23137H11.698C11.698 0.551347 11.1467 0 10.4667 0C9.78664 0 9.23529 0.551347 9.23529 1.23137H8.92745C8.24742 1.23137 7.69608 1.78272 7.69608 2.46275C7.69608 3.14277 8.24742 3.69412 8.92745 3.69412H9.23529V9.23529H3.69412V8.92745C3.69412 8.24743 3.14277 7.69608 2.46274 7.69608C1.78272 7.69608 1.23137 8.24743 1.23137 8.92745V9.23529C0.551347 9.23529 0 9.78664 0 10.4667C0 11.1467 0.551347 11.698 1.23137 11.698Z" fill="white"/>
-</svg>'''
-
-# =============================================================================
-# FIXED CONFIGURATION
-# =============================================================================
-
-CONFIG = {
-    "output_width": 1080,
-    "output_height": 1350,
-    "text_color": "#FFF4EF",
-    "overlay_1_color": (39, 37, 36),
-    "overlay_1_opacity": 0.5,
-    "overlay_2_color": (0, 0, 0),
-    "overlay_2_opacity": 0.2,
-    "quote_font_percent": 0.06,
-    "attribution_font_percent": 0.0315,
-    "margin_lr_percent": 0.242,
-    "margin_top": 0.054,
-    "icon_scale": 2.55,
-    "line_spacing": 1.2,
-}
-
 # =============================================================================
 # SESSION STATE
 # =============================================================================
 
-if 'generated_images' not in st.session_state:
-    st.session_state.generated_images = []
-if 'zip_ready' not in st.session_state:
-    st.session_state.zip_ready = None
-
-# =============================================================================
-# HELPER FUNCTIONS
-# =============================================================================
-
-def hex_to_rgb(hex_color):
-    hex_color = hex_color.lstrip('#')
-    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-
-
-def load_svg_as_image(svg_string, scale=3):
-    """Load SVG from string and convert to PIL Image."""
-    png_data = cairosvg.svg2png(bytestring=svg_string.encode(), scale=scale)
-    return Image.open(io.BytesIO(png_data)).convert("RGBA")
-
-
-def apply_overlay(image, color, opacity):
-    overlay = Image.new('RGBA', image.size, (*color, int(255 * opacity)))
-    return Image.alpha_composite(image.convert('RGBA'), overlay)
-
-
-def soft_light_blend(base, blend, intensity=0.5):
-    """Apply soft light blending mode for film grain effect. Memory optimized."""
-    base_arr = np.array(base, dtype=np.float32) / 255.0
-    blend_arr = np.array(blend.convert('L'), dtype=np.float32) / 255.0
-    
-    blend_arr = 0.5 + (blend_arr - blend_arr.mean()) * intensity
-    np.clip(blend_arr, 0, 1, out=blend_arr)
-    
-    result = np.zeros_like(base_arr)
-    
-    for c in range(min(3, base_arr.shape[2])):
-        b = base_arr[:,:,c]
-        mask = blend_arr < 0.5
-        
-        result[:,:,c] = np.where(
-            mask,
-            2 * b * blend_arr + b * b * (1 - 2 * blend_arr),
-            2 * b * (1 - blend_arr) + np.sqrt(np.clip(b, 0.0001, 1)) * (2 * blend_arr - 1)
-        )
-    
-    if base_arr.shape[2] == 4:
-        result[:,:,3] = base_arr[:,:,3]
-    
-    result = np.clip(result * 255, 0, 255).astype(np.uint8)
-    
-    # Clean up
-    del base_arr, blend_arr
-    
-    return Image.fromarray(result, mode=base.mode)
-
-
-def wrap_text(text, font, max_width, draw):
-    words = text.split()
-    lines = []
-    current_line = []
-    
-    for word in words:
-        test_line = ' '.join(current_line + [word])
-        bbox = draw.textbbox((0, 0), test_line, font=font)
-        width = bbox[2] - bbox[0]
-        
-        if width <= max_width:
-            current_line.append(word)
-        else:
-            if current_line:
-                lines.append(' '.join(current_line))
-            current_line = [word]
-    
-    if current_line:
-        lines.append(' '.join(current_line))
-    
-    return lines
-
-
-def sanitize_filename(name):
-    """Convert saint name to safe filename."""
-    return name.replace(' ', '_').replace('.', '').replace(',', '').replace("'", '')
-
-
-def generate_image(
-    quote,
-    saint_name,
-    background_bytes=None,
-    solid_color=None,
-    grayscale=True,
-    bold_font_bytes=None,
-    light_font_bytes=None,
-    grain_image=None,
-    grain_intensity=0.5
-):
-    """Generate a saint quote image. Memory optimized."""
-    
-    width = CONFIG['output_width']
-    height = CONFIG['output_height']
-    
-    quote_font_size = int(width * CONFIG['quote_font_percent'])
-    attribution_font_size = int(width * CONFIG['attribution_font_percent'])
-    margin_lr = int(width * CONFIG['margin_lr_percent'])
-    margin_top = int(height * CONFIG['margin_top'])
-    icon_scale = CONFIG['icon_scale']
-    
-    # Create background
-    if solid_color:
-        bg = Image.new('RGBA', (width, height), hex_to_rgb(solid_color) + (255,))
-    else:
-        bg = Image.open(io.BytesIO(background_bytes)).convert('RGBA')
-        
-        # Crop to 4:5 aspect ratio
-        target_ratio = width / height
-        current_ratio = bg.width / bg.height
-        
-        if current_ratio > target_ratio:
-            new_width = int(bg.height * target_ratio)
-            left = (bg.width - new_width) // 2
-            bg = bg.crop((left, 0, left + new_width, bg.height))
-        else:
-            new_height = int(bg.width / target_ratio)
-            top = (bg.height - new_height) // 2
-            bg = bg.crop((0, top, bg.width, top + new_height))
-        
-        bg = bg.resize((width, height), Image.Resampling.LANCZOS)
-        
-        if grayscale:
-            bg = ImageOps.grayscale(bg).convert('RGBA')
-        
-        bg = apply_overlay(bg, CONFIG['overlay_1_color'], CONFIG['overlay_1_opacity'])
-        bg = apply_overlay(bg, CONFIG['overlay_2_color'], CONFIG['overlay_2_opacity'])
-    
-    # Apply grain texture (use pre-loaded grain image)
-    if grain_image is not None:
-        bg = soft_light_blend(bg, grain_image, intensity=grain_intensity)
-    
-    draw = ImageDraw.Draw(bg)
-    
-    # Load fonts
-    quote_font = ImageFont.truetype(io.BytesIO(bold_font_bytes), quote_font_size)
-    attribution_font = ImageFont.truetype(io.BytesIO(light_font_bytes), attribution_font_size)
-    
-    # Place icon
-    icon = load_svg_as_image(ICON_SVG, scale=icon_scale)
-    icon_x = (width - icon.width) // 2
-    icon_y = margin_top
-    bg.paste(icon, (icon_x, icon_y), icon)
-    
-    # Clean up icon
-    del icon
-    
-    # Calculate attribution position
-    attr_bbox = draw.textbbox((0, 0), saint_name, font=attribution_font)
-    attr_height = attr_bbox[3] - attr_bbox[1]
-    attr_y = height - margin_top - attr_height
-    
-    # Calculate text area
-    max_text_width = width - (margin_lr * 2)
-    
-    # Wrap and draw quote
-    lines = wrap_text(quote, quote_font, max_text_width, draw)
-    
-    line_height = int(quote_font_size * CONFIG['line_spacing'])
-    total_text_height = len(lines) * line_height
-    
-    # Center quote between icon and attribution
-    icon_bottom = margin_top + int(28 * icon_scale)  # Approximate icon height
-    available_space = attr_y - icon_bottom
-    quote_y = icon_bottom + (available_space - total_text_height) // 2
-    
-    text_color = hex_to_rgb(CONFIG['text_color'])
-    for i, line in enumerate(lines):
-        bbox = draw.textbbox((0, 0), line, font=quote_font)
-        text_width = bbox[2] - bbox[0]
-        x = (width - text_width) // 2
-        y = quote_y + (i * line_height)
-        draw.text((x, y), line, font=quote_font, fill=text_color)
-    
-    # Draw attribution
-    attr_width = attr_bbox[2] - attr_bbox[0]
-    attr_x = (width - attr_width) // 2
-    draw.text((attr_x, attr_y), saint_name, font=attribution_font, fill=text_color)
-    
-    return bg.convert('RGB')
-
-
-def add_image_to_zip(zf, filename, img):
-    """Add a single image to zip file."""
-    img_buffer = io.BytesIO()
-    img.save(img_buffer, format='JPEG', quality=92)  # Slightly lower quality for memory
-    zf.writestr(filename, img_buffer.getvalue())
-    img_buffer.close()
-
+if 'preview_dir' not in st.session_state:
+    st.session_state.preview_dir = None
+if 'live_previews' not in st.session_state:
+    st.session_state.live_previews = {}
+if 'uploads' not in st.session_state:
+    st.session_state.uploads = {}
+if 'parsed_quotes' not in st.session_state:
+    st.session_state.parsed_quotes = None
+if 'download_ready' not in st.session_state:
+    st.session_state.download_ready = None
+if 'archive' not in st.session_state:
+    st.session_state.archive = None
+if 'profile_trace' not in st.session_state:
+    st.session_state.profile_trace = None
+if 'pairing_seed' not in st.session_state:
+    st.session_state.pairing_seed = new_seed()
+if 'manifest' not in st.session_state:
+    st.session_state.manifest = None
+if 'task_id' not in st.session_state:
+    st.session_state.task_id = None
+if 'task_summary' not in st.session_state:
+    st.session_state.task_summary = None
 
 # =============================================================================
 # MAIN APP
@@ -267,13 +107,17 @@ st.divider()
 
 st.subheader("📁 Upload Files")
 
-quotes_file = st.file_uploader("Quotes JSON", type=['json'], help="JSON file with quotes array")
+quotes_file = st.file_uploader(
+    "Quotes",
+    type=quote_extensions(),
+    help=" • ".join(label for label, _ in QUOTE_FORMATS.values())
+)
 
 images_files = st.file_uploader(
     "Background Images", 
     type=['jpg', 'jpeg', 'png'], 
     accept_multiple_files=True,
-    help="Upload multiple images for random pairing"
+    help="Upload multiple images to pair with the quotes"
 )
 
 col1, col2 = st.columns(2)
@@ -284,6 +128,31 @@ with col2:
 
 grain_file = st.file_uploader("Film Grain (optional)", type=['png', 'jpg'], help="Optional texture overlay")
 
+
+def read_upload(upload):
+    """``(bytes, content hash)`` of an upload, read and hashed once per upload.
+
+    Kept in session state by file_id, so reruns, including every live
+    preview update, reuse them. getvalue() shares the upload's buffer
+    rather than copying it.
+    """
+    cached = st.session_state.uploads.get(upload.file_id)
+    if cached is None:
+        data = upload.getvalue()
+        cached = (data, content_hash(data))
+        st.session_state.uploads[upload.file_id] = cached
+    return cached
+
+
+# Forget uploads that have been removed or replaced
+current_uploads = {
+    upload.file_id
+    for upload in [bold_font_file, light_font_file, grain_file, *(images_files or [])]
+    if upload is not None
+}
+for file_id in set(st.session_state.uploads) - current_uploads:
+    del st.session_state.uploads[file_id]
+
 st.divider()
 
 # -----------------------------------------------------------------------------
@@ -300,10 +169,74 @@ with col1:
 with col2:
     use_solid_color = st.checkbox("Use solid color instead", value=False)
 
+output_profiles = st.multiselect(
+    "Formats",
+    options=list(OUTPUT_PROFILES),
+    default=[DEFAULT_PROFILE],
+    format_func=lambda name: OUTPUT_PROFILES[name]["label"],
+    help="Each extra format reuses the same background decode; with several, each gets its own folder."
+)
+
+auto_fit = st.checkbox(
+    "Auto-fit quote size",
+    value=False,
+    help="Pick the largest font size that fits each quote between the icon and the saint's name."
+)
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    encoder_name = st.selectbox(
+        "Image format",
+        options=list(ENCODERS),
+        index=list(ENCODERS).index(DEFAULT_ENCODER),
+        format_func=lambda name: ENCODERS[name][0],
+        help="Instagram takes JPEG and PNG. Progressive JPEG is smaller for the same pixels."
+    )
+lossy = encoder_name != 'png'
+with col2:
+    image_quality = st.slider("Quality", min_value=50, max_value=100, value=92, disabled=not lossy)
+with col3:
+    max_file_kb = st.number_input(
+        "Max file size (KB)",
+        min_value=0,
+        value=0,
+        step=100,
+        disabled=not lossy,
+        help="Use the highest quality that fits this size; ignores the quality slider. 0 = off."
+    )
+
+def keep_pairing_seed():
+    """Copy the seed input into state that outlives the input.
+
+    Streamlit drops a widget's state in runs where it is not drawn, so the
+    seed is kept under its own key while solid color hides the input.
+    """
+    st.session_state.pairing_seed = st.session_state.pairing_seed_input
+
+
+pairing_mode = DEFAULT_PAIRING_MODE
 if use_solid_color:
     solid_color = st.color_picker("Background color", value="#1a1a1a")
 else:
     solid_color = None
+    col1, col2 = st.columns(2)
+    with col1:
+        pairing_mode = st.selectbox(
+            "Background pairing",
+            options=list(PAIRING_MODES),
+            format_func=PAIRING_MODES.get,
+            help="Quotes with a \"background\" file name in the JSON always use that image."
+        )
+    with col2:
+        st.number_input(
+            "Pairing seed",
+            min_value=0,
+            max_value=2 ** 32 - 1,
+            value=int(st.session_state.pairing_seed),
+            key="pairing_seed_input",
+            on_change=keep_pairing_seed,
+            help="The same quotes, images and seed always give the same pairing."
+        )
 
 # Grain intensity slider (only show if grain uploaded)
 grain_intensity = 0.5
@@ -319,6 +252,43 @@ if grain_file:
     if grain_intensity > 0.7:
         st.caption("⚠️ High grain intensity may slow processing for large batches")
 
+archive_mode = st.selectbox(
+    "Archive format",
+    options=['zip-store', 'zip-deflate', 'tar'],
+    format_func=lambda mode: ARCHIVE_MODES[mode][0],
+    help="Encoded images barely compress, so stored ZIP is fastest at nearly the same size."
+)
+
+workers = st.number_input(
+    "Parallel workers",
+    min_value=1,
+    max_value=max(1, os.cpu_count() or 1),
+    value=default_workers(),
+    help="Render processes. 1 renders in the app process (lowest memory)."
+)
+
+reuse_renders = st.checkbox(
+    "Reuse unchanged images",
+    value=True,
+    help="Only render quotes that are new or changed since the last run; the rest come from the render cache."
+)
+
+suggested_budget = default_budget()
+memory_budget_mb = st.number_input(
+    "Memory budget (MB)",
+    min_value=0,
+    value=suggested_budget // (1024 * 1024) if suggested_budget else 1024,
+    step=256,
+    help="Generation backs off (fewer renders in flight, smaller caches, then no worker processes) "
+         "to stay under this. 0 = no limit."
+)
+
+profile_stages = st.checkbox(
+    "Profile stages",
+    value=False,
+    help="Time each render stage and track memory. Slows generation slightly."
+)
+
 st.divider()
 
 # -----------------------------------------------------------------------------
@@ -329,19 +299,31 @@ quotes_ready = quotes_file is not None
 images_ready = (images_files is not None) and (len(images_files) > 0)
 fonts_ready = (bold_font_file is not None) and (light_font_file is not None)
 
-# Load quotes
+# Load quotes, skipping bad rows; the batch checkpoint needs them all up front.
+# Parsed once per upload, not on every rerun, so option changes stay quick
 quotes = []
 if quotes_ready:
-    try:
+    parsed = st.session_state.parsed_quotes
+    if parsed is not None and parsed[0] == quotes_file.file_id:
+        _, quotes, quote_report = parsed
+    else:
+        quote_report = QuoteReport()
         quotes_file.seek(0)
-        quotes_data = json.load(quotes_file)
-        quotes = quotes_data.get('quotes', [])
-    except json.JSONDecodeError:
-        st.error("❌ Invalid JSON file")
+        quotes = list(iter_quotes(quotes_file, quote_format(quotes_file.name), quote_report))
+        st.session_state.parsed_quotes = (quotes_file.file_id, quotes, quote_report)
+    if quote_report.fatal and not quotes:
+        st.error(f"❌ Could not read {quotes_file.name}: {quote_report.fatal}")
         st.stop()
+    if not quote_report.ok:
+        st.warning(f"⚠️ {quote_report.summary()}")
+        with st.expander("Skipped rows"):
+            for where, reason in quote_report.problems:
+                st.caption(f"{where.capitalize()}: {reason}")
+            if quote_report.unlisted:
+                st.caption(f"…and {quote_report.unlisted} more")
 
 # Status
-if quotes_ready and (images_ready or use_solid_color) and fonts_ready:
+if quotes_ready and (images_ready or use_solid_color) and fonts_ready and output_profiles:
     if use_solid_color:
         st.success(f"✅ Ready: {len(quotes)} quotes • Solid color mode")
     else:
@@ -353,11 +335,13 @@ if quotes_ready and (images_ready or use_solid_color) and fonts_ready:
 else:
     missing = []
     if not quotes_ready:
-        missing.append("quotes JSON")
+        missing.append("quotes file")
     if not images_ready and not use_solid_color:
         missing.append("background images")
     if not fonts_ready:
         missing.append("fonts (both)")
+    if not output_profiles:
+        missing.append("at least one format")
     st.warning(f"⚠️ Missing: {', '.join(missing)}")
     st.stop()
 
@@ -365,144 +349,414 @@ else:
 # GENERATE
 # -----------------------------------------------------------------------------
 
-if st.button("✨ Generate All Images", type="primary"):
-    
-    # Clear previous results
-    st.session_state.generated_images = []
-    st.session_state.zip_ready = None
-    gc.collect()
-    
-    # Read fonts once
-    bold_font_file.seek(0)
-    light_font_file.seek(0)
-    bold_bytes = bold_font_file.read()
-    light_bytes = light_font_file.read()
+def load_renderer(background_files=None):
+    """Read the uploads once and build the renderer for the current options.
+
+    ``background_files`` limits the backgrounds read (default: all of them).
+    Returns the renderer and the uploaded background file names by key.
+    """
+    bold_bytes = read_upload(bold_font_file)[0]
+    light_bytes = read_upload(light_font_file)[0]
     
-    # Pre-load and resize grain image once (memory optimization)
+    # Decoded once per texture; the same image object keeps its blend tables across reruns
     grain_image = None
     if grain_file:
-        grain_file.seek(0)
-        grain_image = Image.open(grain_file)
-        grain_image = grain_image.resize(
-            (CONFIG['output_width'], CONFIG['output_height']), 
-            Image.Resampling.LANCZOS
-        )
+        grain_image = cached_grain_image(*read_upload(grain_file))
     
-    # Read images once
-    image_bytes_list = []
+    # Keyed by content hash so prepared bases are cached by content
+    backgrounds = {}
+    background_names = {}
     if not use_solid_color:
-        for img_file in images_files:
-            img_file.seek(0)
-            image_bytes_list.append(img_file.read())
+        for img_file in images_files if background_files is None else background_files:
+            data, key = read_upload(img_file)
+            backgrounds[key] = data
+            background_names[img_file.name] = key
+    
+    renderer = BatchRenderer(
+        bold_font_bytes=bold_bytes,
+        light_font_bytes=light_bytes,
+        backgrounds=backgrounds,
+        solid_color=solid_color if use_solid_color else None,
+        grayscale=use_grayscale,
+        grain_image=grain_image,
+        grain_intensity=grain_intensity,
+        profile=profile_stages,
+        auto_fit=auto_fit,
+        profiles=output_profiles,
+        encoder=make_encoder(
+            encoder_name,
+            quality=image_quality,
+            max_bytes=max_file_kb * 1024 if lossy else None
+        ),
+        thumbnails=True
+    )
+    return renderer, background_names
+
+
+def forget_download():
+    """Stop drawing the archive's download button, releasing its copy."""
+    st.session_state.download_ready = None
+
+
+def clear_results(keep_batch=None):
+    """Drop the previous batch's results (and archives left over from old sessions).
+
+    Thumbnails of ``keep_batch`` stay, so a resumed batch keeps its gallery.
+    """
+    if st.session_state.archive:
+        remove_archive(st.session_state.archive['path'])
+    cleanup_archives()
+    preview_dir = st.session_state.preview_dir
+    if preview_dir and os.path.basename(preview_dir) != keep_batch:
+        PreviewStore(preview_dir).remove()
+    st.session_state.preview_dir = None
+    st.session_state.pop('gallery_page', None)
+    st.session_state.archive = None
+    st.session_state.profile_trace = None
+    st.session_state.manifest = None
+    st.session_state.task_summary = None
+    gc.collect()
+
+
+def start_task(checkpoint, renderer):
+    """Render a checkpoint's unfinished jobs on a background task.
+
+    Every finished image is written to the checkpoint as it arrives, so if
+    the server restarts the batch can be resumed from where it stopped.
+    """
+    clear_results(keep_batch=checkpoint.id)
+    st.session_state.manifest = checkpoint.info.get('pairing_manifest')
+    task = task_registry.submit(
+        checkpoint,
+        renderer,
+        archive_mode,
+        workers=workers,
+        cache=RenderCache() if reuse_renders else None,
+        budget=MemoryBudget(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None,
+        profile=BatchProfile() if profile_stages else None
+    )
+    st.session_state.task_id = task.id
+
+
+def collect_task(task):
+    """Move a finished task's results into the session."""
+    snapshot = task.snapshot()
+    st.session_state.archive = task.archive
+    st.session_state.preview_dir = task.preview_store.directory
+    if task.profile is not None:
+        st.session_state.profile_trace = task.profile.trace()
+    
+    rendered = snapshot['done'] - snapshot['resumed'] - snapshot['reused'] - len(snapshot['errors'])
+    details = [f"{rendered} rendered"]
+    if snapshot['reused']:
+        details.append(f"{snapshot['reused']} unchanged")
+    if snapshot['resumed']:
+        details.append(f"{snapshot['resumed']} from the interrupted run")
+    st.session_state.task_summary = {
+        "state": snapshot['state'],
+        "images": snapshot['done'] - len(snapshot['errors']),
+        "total": snapshot['total'],
+        "details": ', '.join(details),
+        "errors": snapshot['errors'],
+        "oversized": snapshot['oversized'],
+        "pairing_problems": task.checkpoint.info.get('pairing_problems', []),
+        "max_kb": (task.renderer.encoder.max_bytes or 0) // 1024,
+        "failure": task.failure,
+        "memory_events": task.budget.events if task.budget else [],
+    }
+    st.session_state.task_id = None
+    task_registry.discard(task.id)
+
+
+@st.fragment(run_every=1.0)
+def task_progress():
+    """Live progress, previews and cancel for the session's running batch.
+
+    Reruns on its own every second without rerunning the rest of the page.
+    """
+    task = task_registry.get(st.session_state.task_id)
+    if task is None:
+        return
+    if not task.running:
+        collect_task(task)
+        st.rerun()
+    
+    snapshot = task.snapshot()
+    done, total = snapshot['done'], snapshot['total']
+    st.progress(done / total if total else 1.0, text=f"Generated {done}/{total}")
+    for index, error in snapshot['errors'][-3:]:
+        st.error(f"Error on image {index+1}: {error}")
+    
+    if snapshot['cancelling']:
+        st.caption("Cancelling after the images in progress...")
+    elif st.button("⏹️ Cancel", key=f"cancel_{task.id}"):
+        task.cancel()
     
-    # Create ZIP in memory, write images directly to it
-    zip_buffer = io.BytesIO()
-    preview_images = []
+    cols = st.columns(3)
+    for i, (filename, thumbnail) in enumerate(snapshot['previews']):
+        with cols[i % 3]:
+            st.image(thumbnail, caption=filename)
+
+
+@st.fragment
+def gallery(store):
+    """Paginated thumbnails of the last batch, read from disk a page at a time.
+
+    Changing page reruns only this fragment.
+    """
+    total = len(store)
+    if not total:
+        return
+    st.subheader("👁️ Preview")
+    pages = -(-total // GALLERY_PAGE_SIZE)
+    page = 1
+    if pages > 1:
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="gallery_page")
     
-    progress = st.progress(0, text="Starting...")
-    status_text = st.empty()
+    cols = st.columns(3)
+    for i, (filename, thumbnail) in enumerate(store.page(page - 1, GALLERY_PAGE_SIZE)):
+        with cols[i % 3]:
+            st.image(thumbnail, caption=filename)
+    st.caption(f"{total} images • page {page} of {pages} • full size images are in the download")
+
+
+def preview_settings():
+    """Everything besides quote, background and format that a live preview depends on."""
+    return (
+        read_upload(bold_font_file)[1],
+        read_upload(light_font_file)[1],
+        read_upload(grain_file)[1] if grain_file else None,
+        grain_intensity if grain_file else None,
+        use_grayscale,
+        solid_color if use_solid_color else None,
+        auto_fit,
+    )
+
+
+@st.fragment
+def live_preview_panel():
+    """One quote on one background with the current options.
+
+    Picking another quote or background reruns only this fragment, and
+    renders are remembered by their settings: a rerun that changes nothing
+    the image depends on, or changes an option back, shows the stored
+    render instead of drawing it again. With automatic updates off, new
+    settings are only rendered on request.
+    """
+    col1, col2 = st.columns(2)
+    with col1:
+        number = st.number_input("Quote", min_value=1, max_value=len(quotes), value=1)
+    image_files = []
+    if not use_solid_color:
+        with col2:
+            image_index = st.selectbox(
+                "Background",
+                options=range(len(images_files)),
+                format_func=lambda i: images_files[i].name
+            )
+        image_files = [images_files[image_index]]
+    profile = output_profiles[0]
+    if len(output_profiles) > 1:
+        profile = st.radio(
+            "Format",
+            options=output_profiles,
+            format_func=lambda name: OUTPUT_PROFILES[name]["label"],
+            horizontal=True
+        )
+    auto_update = st.toggle("Update automatically", value=True, help="Turn off to render only when asked")
+    
+    quote = quotes[number - 1]
+    background_key = read_upload(image_files[0])[1] if image_files else None
+    key = (preview_settings(), quote['text'], quote['saint'], background_key, profile)
+    
+    memo = st.session_state.live_previews
+    remembered = memo.pop(key, None)
+    if remembered is not None:
+        data, ms = remembered
+        note = "Unchanged since it was last rendered"
+    elif auto_update or st.button("🔄 Render preview"):
+        renderer, _ = load_renderer(image_files)
+        data, ms = live_preview(renderer, quote['text'], quote['saint'], background_key, profile)
+        note = f"Rendered in {ms:.0f} ms"
+    else:
+        st.caption("Settings changed since the last preview")
+        return
+    memo[key] = (data, ms)
+    while len(memo) > LIVE_PREVIEW_MEMO:
+        memo.pop(next(iter(memo)))
+    
+    st.image(data, caption=quote['saint'])
+    st.caption(f"{note} • shown at half size")
+
+
+running_ids = {task.id for task in task_registry.running()}
+session_task = task_registry.get(st.session_state.task_id)
+
+# Batches cut short by a server restart, and batches still running whose
+# session was lost (e.g. the browser tab was closed)
+cleanup_checkpoints(keep=running_ids)
+unfinished = list_checkpoints()
+keep_previews = running_ids | {checkpoint.id for checkpoint in unfinished}
+if st.session_state.preview_dir:
+    keep_previews.add(os.path.basename(st.session_state.preview_dir))
+cleanup_previews(keep=keep_previews)
+if session_task is None:
+    for task in task_registry.running():
+        snapshot = task.snapshot()
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.info(f"⏳ Batch in progress: {snapshot['done']}/{snapshot['total']} images done")
+        with col2:
+            if st.button("Follow", key=f"follow_{task.id}"):
+                st.session_state.task_id = task.id
+                st.rerun()
+
+for checkpoint in unfinished:
+    if checkpoint.id in running_ids:
+        continue
+    status = checkpoint.status()
+    started = datetime.fromtimestamp(status['created']).strftime("%b %d %H:%M")
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        st.info(f"⏸️ Unfinished batch from {started}: {status['done']}/{status['total']} images done")
+    with col2:
+        resume = st.button("Resume", key=f"resume_{checkpoint.id}", disabled=session_task is not None)
+    with col3:
+        if st.button("Discard", key=f"discard_{checkpoint.id}"):
+            checkpoint.remove()
+            PreviewStore.for_batch(checkpoint.id).remove()
+            st.rerun()
+    
+    if resume:
+        renderer, _ = load_renderer()
+        missing = {job.background_key for job in checkpoint.pending()} - set(renderer.backgrounds) - {None}
+        if render_fingerprint(renderer) != checkpoint.fingerprint or missing:
+            st.error("❌ Upload the same fonts, backgrounds and grain, with the same options, to resume this batch")
+        else:
+            start_task(checkpoint, renderer)
+            st.rerun()
+
+if quotes:
+    with st.expander("🔍 Live preview", expanded=True):
+        live_preview_panel()
+
+if st.button("✨ Generate All Images", type="primary", disabled=session_task is not None):
+    renderer, background_names = load_renderer()
+    background_keys = list(renderer.backgrounds)
+    
+    # Pair quotes with backgrounds up front from the seed; rendering may run
+    # out of order, and an unchanged seed pairs unchanged quotes the same way
+    # Pins to backgrounds that are not uploaded are reported, not fatal
+    seed = int(st.session_state.pairing_seed)
+    pairing_report = QuoteReport()
+    jobs = build_jobs(
+        quotes,
+        background_keys,
+        seed=seed,
+        mode=pairing_mode,
+        names=background_names,
+        profiles=output_profiles,
+        extension=renderer.encoder.extension,
+        report=pairing_report
+    )
+    manifest = pairing_manifest(jobs, seed, pairing_mode, background_names) if background_keys else None
     
-    try:
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for i, quote_data in enumerate(quotes):
-                quote_text = quote_data.get('text', '')
-                saint_name = quote_data.get('saint', 'Unknown Saint')
-                
-                if use_solid_color:
-                    bg_bytes = None
-                else:
-                    bg_bytes = random.choice(image_bytes_list)
-                
-                try:
-                    img = generate_image(
-                        quote=quote_text,
-                        saint_name=saint_name,
-                        background_bytes=bg_bytes,
-                        solid_color=solid_color if use_solid_color else None,
-                        grayscale=use_grayscale,
-                        bold_font_bytes=bold_bytes,
-                        light_font_bytes=light_bytes,
-                        grain_image=grain_image,
-                        grain_intensity=grain_intensity
-                    )
-                    
-                    safe_name = sanitize_filename(saint_name)
-                    filename = f"{safe_name}_{i+1:03d}.jpg"
-                    
-                    # Write directly to ZIP (memory efficient)
-                    add_image_to_zip(zf, filename, img)
-                    
-                    # Keep only first 6 for preview
-                    if len(preview_images) < 6:
-                        preview_images.append((filename, img.copy()))
-                    
-                    # Clean up
-                    del img
-                    
-                except Exception as e:
-                    st.error(f"Error on image {i+1}: {str(e)}")
-                    continue
-                
-                # Update progress
-                pct = (i + 1) / len(quotes)
-                progress.progress(pct, text=f"Generated {i + 1}/{len(quotes)}")
-                
-                # Garbage collect every 50 images
-                if (i + 1) % 50 == 0:
-                    gc.collect()
-                    status_text.text(f"Processing... {i+1}/{len(quotes)} complete")
-        
-        # Store results
-        st.session_state.generated_images = preview_images
-        zip_buffer.seek(0)
-        st.session_state.zip_ready = zip_buffer.getvalue()
-        
-        progress.empty()
-        status_text.empty()
-        st.success(f"✅ Generated {len(quotes)} images!")
-        
-        # Final cleanup
-        del image_bytes_list, bold_bytes, light_bytes
-        if grain_image:
-            del grain_image
-        gc.collect()
-        
-    except Exception as e:
-        st.error(f"❌ Generation failed: {str(e)}")
-        # Try to save what we have
-        if zip_buffer.tell() > 0:
-            zip_buffer.seek(0)
-            st.session_state.zip_ready = zip_buffer.getvalue()
-            st.warning("⚠️ Partial results may be available for download")
+    # Render each background's quotes together so its base is prepared once
+    checkpoint = BatchCheckpoint.create(
+        group_by_background(jobs),
+        render_fingerprint(renderer),
+        info={"pairing_manifest": manifest, "pairing_problems": pairing_report.problems}
+    )
+    start_task(checkpoint, renderer)
+    st.rerun()
+
+if st.session_state.task_id:
+    task_progress()
 
 # -----------------------------------------------------------------------------
 # DOWNLOAD & PREVIEW
 # -----------------------------------------------------------------------------
 
-if st.session_state.zip_ready:
+summary = st.session_state.task_summary
+if summary:
+    if summary['state'] == 'done':
+        st.success(f"✅ Generated {summary['images']} images ({summary['details']})!")
+    elif summary['state'] == 'cancelled':
+        st.warning(f"⏹️ Cancelled after {summary['images']}/{summary['total']} images; resume the batch to finish it")
+    else:
+        st.error(f"❌ Generation failed: {summary['failure']}")
+        st.warning("⚠️ Finished images are saved; resume the batch to continue, or download what is done")
+    for index, error in summary['errors'][:10]:
+        st.error(f"Error on image {index+1}: {error}")
+    if len(summary['errors']) > 10:
+        st.caption(f"...and {len(summary['errors']) - 10} more errors")
+    if summary['pairing_problems']:
+        st.warning(
+            "⚠️ Pinned backgrounds not uploaded; these quotes were paired like the rest:\n\n"
+            + "\n\n".join(f"{where.capitalize()}: {reason}" for where, reason in summary['pairing_problems'])
+        )
+    if summary['oversized']:
+        st.warning(f"⚠️ {summary['oversized']} image(s) are over {summary['max_kb']} KB even at the lowest quality")
+    if summary['memory_events']:
+        st.warning("⚠️ Slowed down to stay within the memory budget:\n\n" + "\n\n".join(summary['memory_events']))
+
+archive = st.session_state.archive
+if archive and os.path.isfile(archive['path']):
     st.divider()
     
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
+    label, extension, mime = ARCHIVE_MODES[archive['mode']]
+    
+    # download_button copies the whole file into Streamlit's media store on
+    # every run it is drawn, so it is only drawn on request and until used
+    if st.session_state.download_ready != archive['path']:
+        if st.button(f"📦 Prepare {label.split()[0]} download"):
+            st.session_state.download_ready = archive['path']
+            st.rerun()
+    else:
+        with open(archive['path'], 'rb') as archive_file:
+            st.download_button(
+                label=f"📥 Download {label.split()[0]}",
+                data=archive_file,
+                file_name=f"daily_saint_{timestamp}{extension}",
+                mime=mime,
+                on_click=forget_download
+            )
+    st.caption(format_report(archive['report']))
+    
+    if st.session_state.manifest:
+        st.download_button(
+            label="📥 Download pairing manifest",
+            data=json.dumps(st.session_state.manifest, indent=2),
+            file_name=f"daily_saint_pairing_{timestamp}.json",
+            mime="application/json"
+        )
+
+if st.session_state.profile_trace:
+    trace = st.session_state.profile_trace
+    st.subheader("⏱️ Stage Breakdown")
+    st.caption(
+        f"{trace['images']} images in {trace['seconds']}s • "
+        f"RSS {trace['rss_start_mb']} → {trace['rss_end_mb']} MB"
+    )
+    st.dataframe(
+        trace['summary'],
+        column_order=["stage", "calls", "total_s", "share_pct", "mean_ms", "max_ms", "traced_peak_kb", "rss_delta_mb"],
+        hide_index=True
+    )
     st.download_button(
-        label=f"📥 Download ZIP",
-        data=st.session_state.zip_ready,
-        file_name=f"daily_saint_{timestamp}.zip",
-        mime="application/zip"
+        label="📥 Download trace (JSON)",
+        data=json.dumps(trace, indent=2),
+        file_name="daily_saint_trace.json",
+        mime="application/json"
     )
 
-if st.session_state.generated_images:
-    # Preview
-    st.subheader("👁️ Preview")
-    
-    cols = st.columns(3)
-    for i, (filename, img) in enumerate(st.session_state.generated_images[:6]):
-        with cols[i % 3]:
-            st.image(img, caption=filename)
+if st.session_state.preview_dir:
+    gallery(PreviewStore(st.session_state.preview_dir))
 
 # -----------------------------------------------------------------------------
 # FOOTER
 # -----------------------------------------------------------------------------
 
 st.divider()
-st.caption("Made for The Daily Saint • Click generate again for new random pairings")
+st.caption("Made for The Daily Saint • Change the pairing seed for new pairings")
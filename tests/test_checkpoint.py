@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from daily_saint.batch import RenderResult, build_jobs
+from daily_saint.checkpoint import BatchCheckpoint
+from daily_saint.output import DirectorySink
+
+
+@pytest.mark.parametrize("saint", ["/x", "../x", "..\\x", "a/../../x"])
+def test_saint_names_stay_inside_checkpoint(tmp_path, saint):
+    jobs = build_jobs([{"text": "Pray.", "saint": saint}], profiles=["feed", "story"])
+    checkpoint = BatchCheckpoint.create(jobs, "fingerprint", directory=str(tmp_path / "ck"))
+    for job in jobs:
+        checkpoint.record(RenderResult(job.index, job.filename, b"jpeg", None))
+
+    root = os.path.realpath(tmp_path / "ck")
+    written = [os.path.join(d, f) for d, _, files in os.walk(tmp_path) for f in files]
+    assert all(os.path.realpath(path).startswith(root + os.sep) for path in written)
+
+    resumed = BatchCheckpoint.load(str(tmp_path / "ck"))
+    assert resumed.is_complete()
+    sink = resumed.assemble(DirectorySink(str(tmp_path / "ck" / "out")))
+    assert sink.count == len(jobs)
@@ -0,0 +1,39 @@
+import io
+
+from PIL import Image
+
+from daily_saint.backgrounds import BackgroundCache
+from daily_saint.config import profile_config
+from daily_saint.memory import MIN_CACHE_BYTES, cache_floor
+
+SIZES = [
+    (config['output_width'], config['output_height'])
+    for config in map(profile_config, ['feed', 'story', 'square'])
+]
+
+
+def _background():
+    buffer = io.BytesIO()
+    Image.new('RGB', (1200, 1600), (90, 60, 30)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def test_floor_holds_every_format():
+    assert cache_floor([]) == MIN_CACHE_BYTES
+    assert cache_floor(SIZES) == sum(w * h * 4 for w, h in SIZES)
+
+
+def test_multi_format_jobs_build_each_base_once_at_the_floor():
+    cache = BackgroundCache(max_bytes=cache_floor(SIZES))
+    data = _background()
+    for _ in range(5):
+        for size in SIZES:
+            cache.prefetch(data, SIZES, grayscale=False)
+            cache.get(data, size, grayscale=False)
+    assert cache.misses == len(SIZES)
+
+
+def test_prefetch_skips_sizes_the_cache_cannot_keep():
+    cache = BackgroundCache(max_bytes=MIN_CACHE_BYTES)
+    assert cache.prefetch(_background(), SIZES, grayscale=False) == 0
+    assert len(cache) == 0
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+from daily_saint.output import DirectorySink
+
+
+@pytest.mark.parametrize("filename", ["/abs/escape_001.jpg", "../escape_001.jpg", "feed/../../escape_001.jpg"])
+def test_folder_sink_stays_inside(tmp_path, filename):
+    sink = DirectorySink(str(tmp_path / "out"))
+    with pytest.raises(ValueError):
+        sink.add(filename, b"x")
+    assert not list(tmp_path.glob("escape*"))
+
+
+def test_folder_sink_writes_profile_folders(tmp_path):
+    sink = DirectorySink(str(tmp_path / "out"))
+    sink.add("story/Saint_001.jpg", b"x")
+    assert os.path.isfile(tmp_path / "out" / "story" / "Saint_001.jpg")
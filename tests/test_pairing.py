@@ -0,0 +1,38 @@
+import random
+from collections import Counter
+
+import pytest
+
+from daily_saint.pairing import BalancedDeck, pair_backgrounds
+from daily_saint.quotes import QuoteReport
+
+
+@pytest.mark.parametrize("keys", [["a"], ["a", "b"]])
+def test_deck_stays_bounded(keys):
+    deck = BalancedDeck(keys, random.Random(0))
+    previous = None
+    for _ in range(10_000):
+        previous = deck.draw(avoid=previous)
+        assert len(deck._deck) <= 2 * len(keys)
+
+
+def test_single_background_repeats():
+    assert pair_backgrounds([{"text": "x"}] * 5, ["a"], seed=1) == ["a"] * 5
+
+
+def test_two_backgrounds_alternate_evenly():
+    keys = pair_backgrounds([{"text": "x"}] * 1000, ["a", "b"], seed=1)
+    assert all(x != y for x, y in zip(keys, keys[1:]))
+    assert Counter(keys) == {"a": 500, "b": 500}
+
+
+def test_missing_pin_is_reported_and_paired():
+    quotes = [{"text": "x"}, {"text": "y", "background": "gone.jpg"}, {"text": "z", "background": "a.jpg"}]
+    with pytest.raises(ValueError):
+        pair_backgrounds(quotes, ["a", "b"], seed=1, names={"a.jpg": "a"})
+
+    report = QuoteReport()
+    keys = pair_backgrounds(quotes, ["a", "b"], seed=1, names={"a.jpg": "a"}, report=report)
+    assert keys[1] in ("a", "b") and keys[2] == "a"
+    assert report.unpinned == 1 and not report.ok
+    assert report.problems[0][0] == "quote 2"